@@ -3,7 +3,7 @@ from datetime import datetime, timezone
 import json
 import re
 from analyze_comments import logger
-from preprocessing_main import preprocess
+from preprocessing_main import Preprocessor
 
 
 llm = Ollama(
@@ -16,16 +16,17 @@ llm = Ollama(
 
 #### Preprocessing text (using prerocessing_main)
 
+_match_preprocessor = Preprocessor(
+    remove_halfspace=True,
+    replace_multiple_spaces=True,
+    replace_enter_with_space=True
+)
+
 def normalize_for_match(text: str) -> str:
     if not text:
         return ""
 
-    text = preprocess(
-        text,
-        remove_halfspace=True,
-        replace_multiple_spaces=True,
-        replace_enter_with_space=True
-    )
+    text = _match_preprocessor(text)
     return text.strip()
 
 def infer_AI_title_from_title(title: str, title_AI_title_map):
@@ -3,7 +3,7 @@ from datetime import datetime, timezone
 import json
 import re
 from analyze_comments import logger
-from preprocessing_main import preprocess
+from preprocessing_main import Preprocessor
 from connect_to_database_func import connect_db
 
 
@@ -17,16 +17,17 @@ llm_summarize = Ollama(
 
 #### Preprocessing text (using prerocessing_main)
 
+_match_preprocessor = Preprocessor(
+    remove_halfspace=True,
+    replace_multiple_spaces=True,
+    replace_enter_with_space=True
+)
+
 def normalize_for_match(text: str) -> str:
     if not text:
         return ""
 
-    text = preprocess(
-        text,
-        remove_halfspace=True,
-        replace_multiple_spaces=True,
-        replace_enter_with_space=True
-    )
+    text = _match_preprocessor(text)
     return text.strip()
 
 
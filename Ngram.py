@@ -2,7 +2,7 @@
 
 # from sklearn.feature_extraction.text import CountVectorizer
 # from hazm import Normalizer, word_tokenize, Stemmer, Lemmatizer, stopwords_list
-from preprocessing_main import preprocess
+from preprocessing_main import Preprocessor, preprocess_batch
 from connect_to_database_func import connect_db
 import pandas as pd
 from nltk.tokenize import word_tokenize
@@ -104,22 +104,34 @@ def load_stopwords(filepath="stopwords.txt"):
 # -----------------------------------
 STOPWORDS = load_stopwords("stopwords.txt")
 
+# Your custom preprocessing, compiled once for every comment
+NGRAM_PREPROCESSOR = Preprocessor(
+    convert_farsi_numbers=True,
+    convert_arabic_characters=True,
+    remove_diacritic=True,
+    remove_numbers=True,
+    remove_punctuations=True,
+    replace_multiple_spaces=True,
+    remove_ha_suffix=True
+)
+
 def clean_and_tokenize(text: str):
     if not isinstance(text, str):
         return []
 
     # Use your custom preprocessing
-    cleaned_text = preprocess(
-        text,
-        convert_farsi_numbers=True,
-        convert_arabic_characters=True,
-        remove_diacritic=True,
-        remove_numbers=True,
-        remove_punctuations=True,
-        replace_multiple_spaces=True,
-        remove_ha_suffix=True
-    )
+    cleaned_text = NGRAM_PREPROCESSOR(text)
+    return tokenize_cleaned(cleaned_text)
+
+
+def clean_and_tokenize_batch(texts, workers=None):
+    """clean_and_tokenize for a whole list; preprocessing runs in batch (see preprocess_batch for the optional pool)."""
+    texts = [text if isinstance(text, str) else "" for text in texts]
+    cleaned_texts = preprocess_batch(texts, NGRAM_PREPROCESSOR, workers=workers)
+    return [tokenize_cleaned(cleaned_text) for cleaned_text in cleaned_texts]
+
 
+def tokenize_cleaned(cleaned_text: str):
     # Use NLTK tokenizer (works fine for Persian with spacing)
     tokens = word_tokenize(cleaned_text)
 
@@ -172,8 +184,9 @@ def clean_and_tokenize(text: str):
 
 
 def extract_top_ngrams_tfidf(texts, ngram_range, top_k, min_df=3):
+    # texts are raw comments or token lists from clean_and_tokenize_batch
     vectorizer = TfidfVectorizer(
-        tokenizer=clean_and_tokenize,
+        tokenizer=lambda doc: doc if isinstance(doc, list) else clean_and_tokenize(doc),
         preprocessor=lambda x: x,
         token_pattern=None,
         ngram_range=ngram_range,
@@ -225,7 +238,8 @@ def run_ngram_analysis(sentiment=None, start_date=None, end_date=None, top_k=25
 
     # df = group_sentiments(df)
 
-    texts = df["description"].tolist()
+    # Preprocess and tokenize once for both n-gram passes
+    texts = clean_and_tokenize_batch(df["description"].tolist())
 
     bigram_k = int(top_k * 0.6)
     trigram_k = top_k - bigram_k
@@ -3,18 +3,18 @@ from jsonrpc import JSONRPCResponseManager, dispatcher
 from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
 
 import threading
+import os
 from cafe_bazar_app.comment_scraper import fetch_app_urls_to_crawl, crawl_comments
 from cafe_bazar_app.app_scraper_check import give_information_app, check_and_create_app_id
-from cafe_bazar_app.analyze_sentiment_apps import fetch_comments_to_analyze_apps, analyze_and_update_sentiment_apps
+from cafe_bazar_app.analyze_sentiment_apps import run_sentiment_apps
 from cafe_bazar_app.logging_config import setup_logger
+from cafe_bazar_app.sentiment_model_func import start_model_warmup, models_status
 from Ngram import run_ngram_analysis
 
 #####################################################
-from analyze_sentiment_dima import (
-    analyze_and_update_sentiment as analyze_and_update_sentiment_dima,
-    fetch_comments_to_analyze as fetch_comments_to_analyze_dima
-)
+from analyze_sentiment_dima import run_sentiment_pipeline_dima, run_sentiment_sharded_dima, run_sentiment_rescore_dima
 from repetitive_detection import flag_repetitive_comments
+from near_duplicate_detection import flag_near_duplicate_comments
 
 ######################################################################################
 
@@ -186,6 +186,12 @@ def check_task_status(task_id):
             "error": task.get("error")
         }
 
+#################################################################################################
+## readiness of the sentiment models (loaded lazily / by the warm-up thread)
+@dispatcher.add_method
+def sentiment_models_status():
+    return models_status()
+
 #################################################################################################
 ## status of all tasks
 @dispatcher.add_method
@@ -301,7 +307,7 @@ def summarization_dima(requests):
 
 ##########################
 @dispatcher.add_method
-def sentiment_analysis_dima(limit=100):
+def sentiment_analysis_dima(limit=100, workers=None):
 
     global tasks_status
 
@@ -330,28 +336,27 @@ def sentiment_analysis_dima(limit=100):
 
         logger_sentiment_dima.info("Starting Dima sentiment analysis...")
 
-        total_processed = 0
-
-        while True:
-            comments = fetch_comments_to_analyze_dima(
+        # workers > 1: one forked process per id shard (backfills)
+        if workers is not None and int(workers) > 1:
+            sharded_result = run_sentiment_sharded_dima(
                 logger_sentiment_dima,
+                num_workers=int(workers),
                 limit=limit
             )
+            logger_sentiment_dima.info("Dima sentiment analysis completed.")
+            return sharded_result
 
-            if not comments:
-                break
-
-            analyze_and_update_sentiment_dima(
-                logger_sentiment_dima,
-                comments
-            )
-
-            total_processed += len(comments)
+        # fetch -> infer -> write pipeline, see cafe_bazar_app/sentiment_pipeline.py
+        pipeline_result = run_sentiment_pipeline_dima(
+            logger_sentiment_dima,
+            limit=limit
+        )
 
         logger_sentiment_dima.info("Dima sentiment analysis completed.")
 
         return {
-            "processed_comments": total_processed
+            "processed_comments": pipeline_result["processed_comments"],
+            "bottleneck": pipeline_result["bottleneck"]
         }
 
     threading.Thread(
@@ -365,6 +370,84 @@ def sentiment_analysis_dima(limit=100):
         "message": "Task started: Dima sentiment analysis"
     }
 
+##########################
+@dispatcher.add_method
+def sentiment_rescore_dima(limit=100, max_rows=None, delay=None):
+
+    global tasks_status
+
+    task_id = "6"
+
+    with tasks_lock:
+        tasks_status[task_id] = {
+            "status": "started",
+            "description": "Re-scoring Dima comments with a stale sentiment version",
+            "result": None,
+            "error": None
+        }
+
+    limit = int(limit)
+    max_rows = int(max_rows) if max_rows is not None else None
+    delay = float(delay) if delay is not None else None
+
+    def wrapped_task():
+        # newest stale rows first, one page every `delay` seconds (SENTIMENT_RESCORE_DELAY)
+        rescore_result = run_sentiment_rescore_dima(
+            logger_sentiment_dima,
+            limit=limit,
+            max_rows=max_rows,
+            delay=delay,
+            page_lock=gpu_lock
+        )
+        logger_sentiment_dima.info(f"Dima sentiment re-score completed ({rescore_result['processed_comments']} comments).")
+        return {"processed_comments": rescore_result["processed_comments"]}
+
+    # takes the GPU lock per page (not for the whole run), so regular sentiment runs
+    # for new comments get the GPU between re-score pages
+    threading.Thread(
+    target=perform_task,
+    args=(task_id, wrapped_task),
+    kwargs={"use_gpu": False}
+).start()
+
+    return {
+        "task_id": task_id,
+        "message": "Task started: Dima sentiment re-score"
+    }
+
+##########################
+@dispatcher.add_method
+def near_duplicate_dima():
+
+    global tasks_status
+
+    task_id = "7"
+
+    with tasks_lock:
+        tasks_status[task_id] = {
+            "status": "started",
+            "description": "Clustering near-duplicate Dima comments",
+            "result": None,
+            "error": None
+        }
+
+    def wrapped_task():
+        # MinHash LSH over comments above the 'near_duplicate' watermark; no model, no GPU lock
+        near_count = flag_near_duplicate_comments()
+        logger_sentiment_dima.info(f"Near-duplicate detection finished. Clustered {near_count} comments.")
+        return {"clustered_comments": near_count}
+
+    threading.Thread(
+    target=perform_task,
+    args=(task_id, wrapped_task),
+    kwargs={"use_gpu": False}
+).start()
+
+    return {
+        "task_id": task_id,
+        "message": "Task started: Dima near-duplicate detection"
+    }
+
 ############################################################################################################################
 
 @dispatcher.add_method
@@ -430,21 +513,20 @@ def fetch_and_crawl_comments_apps(app_ids):
 
 def analyze_sentiments_apps(app_ids):
     logger.info("Starting sentiment analysis from app_comments...")
-    for app_id in app_ids:
-        try:
-            comments = fetch_comments_to_analyze_apps(logger_sentiment_apps,app_id)
-            if not comments:
-                logger.info(f"No comments left to analyze from app_comments for app_id {app_id}")
-                continue
-            analyze_and_update_sentiment_apps(logger_sentiment_apps,comments, app_id)
-            logger.info(f"Sentiment analysis completed from app_comments for app_id {app_id}")
-        except Exception as e:
-            logger.error(f"Error during sentiment analysis from app_comments for app_id {app_id}: {e}", exc_info=True)
+    # one cross-app work queue instead of one app after another
+    try:
+        result = run_sentiment_apps(logger_sentiment_apps, app_ids)
+        logger.info(f"Sentiment analysis completed from app_comments for app_ids {app_ids} ({result['processed_comments']} comments)")
+    except Exception as e:
+        logger.error(f"Error during sentiment analysis from app_comments for app_ids {app_ids}: {e}", exc_info=True)
 
 
 if __name__ == "__main__":
     logger.info("Server running on port 5000...")
     crawl_event.set()
+    # Load the sentiment models in the background; set SENTIMENT_WARMUP=0 to load on first use
+    if os.getenv("SENTIMENT_WARMUP", "1") != "0":
+        start_model_warmup(logger)
     # server = HTTPServer(("0.0.0.0", 5000), RequestHandler)
     server = ThreadingHTTPServer(("0.0.0.0", 5000), RequestHandler)
 
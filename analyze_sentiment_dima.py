@@ -1,108 +1,125 @@
 # Import libraries
+import contextlib
+import os
 import time
 # Connect to database
 from connect_to_database_func import connect_db
 from dotenv import load_dotenv
-from cafe_bazar_app.sentiment_model_func import run_first_model, run_second_model, validate_and_score_sentiment
+from cafe_bazar_app.sentiment_model_func import log_cache_stats, log_cascade_stats, sentiment_fingerprint
+from cafe_bazar_app.sentiment_writer import SentimentWriter
+from cafe_bazar_app.sentiment_pipeline import run_sentiment_pipeline
+from cafe_bazar_app.sentiment_engine import SentimentEngine, dima_source, score_comments
 
 # Load environment variables from .env file
 load_dotenv()
 
 
-# Fetch dima_comments that need sentiment analysis for a specific app
-def fetch_comments_to_analyze(logger, limit=100):
-    logger.info("Fetching comments from 'dima_comments' table where sentiment not analyzed yet.")
+# AND created_at > '2026-01-20' AND created_at < '2026-01-25'
+
+# Pause between re-score pages so a background re-score leaves CPU for new comments
+SENTIMENT_RESCORE_DELAY = float(os.getenv("SENTIMENT_RESCORE_DELAY", "2"))
+
+
+# Fetch already scored comments whose sentiment_version differs from the current fingerprint
+# (or that have no sentiment_source yet), newest first.
+# before=(created_at, id) of the last row of the previous page (keyset)
+def fetch_stale_comments(logger, version, limit=100, before=None):
+    logger.info("Fetching comments from 'dima_comments' scored with an older sentiment version.")
     try:
         conn = connect_db()
         cursor = conn.cursor()
         query = """
-            SELECT id, description, grade
+            SELECT id, description, grade, created_at
             FROM dima_comments
-            WHERE sentiment_result IS NULL OR sentiment_result=''
-            ORDER BY id ASC
+            WHERE sentiment_result IS NOT NULL AND sentiment_result <> ''
+              AND (sentiment_version IS DISTINCT FROM %s OR sentiment_source IS NULL)
+              {keyset}
+            ORDER BY created_at DESC, id DESC
             LIMIT %s;
         """
-        cursor.execute(query, (limit,))
+        if before is None:
+            cursor.execute(query.format(keyset=""), (version, limit))
+        else:
+            cursor.execute(query.format(keyset="AND (created_at, id) < (%s, %s)"), (version, before[0], before[1], limit))
         comments = cursor.fetchall()
-        logger.info(f"Fetched {len(comments)} comments for analysis from dima_comments.")
+        logger.info(f"Fetched {len(comments)} stale comments for re-scoring from dima_comments.")
         cursor.close()
         conn.close()
         return comments
     except Exception as e:
-        logger.error(f"Error fetching comments from dima_comments: {e}", exc_info=True)
+        logger.error(f"Error fetching stale comments from dima_comments: {e}", exc_info=True)
         return []
 
-# AND created_at > '2026-01-20' AND created_at < '2026-01-25'
+# Score one page of dima_comments without touching the database
+# Returns ([(comment_id, sentiment_result, sentiment_score, second_model_processed, sentiment_source)], cascade stats)
+def score_sentiment_dima(logger, comments, batch_size=None):
+    source = dima_source(connect_db)
+    results, stats = score_comments(
+        logger, [(source,) + tuple(comment) for comment in comments], batch_size=batch_size
+    )
+    log_cache_stats(logger)
+    log_cascade_stats(logger, stats)
+    return [tuple(result[1:]) for result in results], stats
+
+
+# Pipelined run over all unscored dima_comments: a reader thread prefetches the next
+# page, this thread runs the models and a writer thread commits results in bulk
+def run_sentiment_pipeline_dima(logger, limit=100, batch_size=None, queue_size=2, shard=None, on_progress=None):
+    logger.info("Starting pipelined sentiment analysis from dima_comments")
+    engine = SentimentEngine(logger, [dima_source(connect_db)], page_size=limit, batch_size=batch_size)
+    return engine.run(queue_size=queue_size, shard=shard, on_progress=on_progress)
+
+
+# Backfill mode: fork num_workers processes after model load, each owning one id shard
+def run_sentiment_sharded_dima(logger, num_workers=None, limit=100, batch_size=None, threads_per_worker=None):
+    engine = SentimentEngine(logger, [dima_source(connect_db)], page_size=limit, batch_size=batch_size)
+    return engine.run_sharded(num_workers=num_workers, threads_per_worker=threads_per_worker)
+
+
+# Incremental re-score after a model or rules change: only rows whose stored fingerprint is
+# stale, newest first, throttled by delay seconds per page and stopped after max_rows
+def run_sentiment_rescore_dima(logger, limit=100, max_rows=None, delay=None, batch_size=None, page_lock=None):
+    """
+    page_lock (e.g. the RPC server's GPU lock) is held only while one page is scored and
+    is free during the delay between pages, so regular sentiment runs can go in between.
+    """
+    delay = SENTIMENT_RESCORE_DELAY if delay is None else delay
+    page_lock = page_lock or contextlib.nullcontext()
+    writer = SentimentWriter(logger, connect_db, "dima_comments", "id", version=sentiment_fingerprint())
+    logger.info(f"Starting re-score of dima_comments not scored with sentiment version {writer.version}")
+    position = {"before": None, "fetched": 0, "scored_pages": 0}
+
+    def fetch_page(_after_id):
+        # keyset is (created_at, id) descending, kept here instead of the pipeline's id cursor
+        if max_rows is not None and position["fetched"] >= max_rows:
+            return []
+        page_limit = limit if max_rows is None else min(limit, max_rows - position["fetched"])
+        rows = fetch_stale_comments(logger, writer.version, limit=page_limit, before=position["before"])
+        if rows:
+            position["before"] = (rows[-1][3], rows[-1][0])
+            position["fetched"] += len(rows)
+        return [row[:3] for row in rows]
+
+    def score_page(comments):
+        # throttle between pages outside the lock
+        if position["scored_pages"] and delay:
+            time.sleep(delay)
+        position["scored_pages"] += 1
+        with page_lock:
+            return score_sentiment_dima(logger, comments, batch_size=batch_size)[0]
+
+    def write_results(results):
+        for result in results:
+            writer.add(*result)
+        writer.flush()
 
-# Update the comment table with the sentiment result and sentiment score
-def update_sentiment_dima(logger,id, sentiment_result, sentiment_score, second_model_processed):
     try:
-        conn = connect_db()
-        cursor = conn.cursor()
-        query = """
-            UPDATE dima_comments
-            SET sentiment_result = %s, sentiment_score = %s, second_model_processed = %s
-            WHERE id = %s;
-        """
-        cursor.execute(query, (sentiment_result, sentiment_score, second_model_processed, id))
-        conn.commit()
-        cursor.close()
-        conn.close()
-    except Exception as e:
-        logger.error(f"Error updating sentiment from dima_comments for comment_id: {id}: {e}", exc_info=True)
-
-
-
-# Main function to fetch comments for dima application and update sentiments
-def analyze_and_update_sentiment(logger, comments):
-    logger.info("Starting sentiment analysis from dima_comments")
-    for comment_id, comment_text, comment_rating in comments:
-        try:
-            logger.info(f"Analyzing sentiment for comment_id: {comment_id}")
-
-            # Handle empty or whitespace-only comment
-            if not comment_text or comment_text.strip() == "":
-                sentiment_result = "no comments"
-                sentiment_score = 0
-                second_model_processed = False
-                logger.info(f"Comment {comment_id} is empty — marked as 'no comments'")
-                update_sentiment_dima(logger,comment_id, sentiment_result, sentiment_score, second_model_processed)
-                continue  # Skip to next comment
-
-            # Run MT5 model
-            sentiment_result = run_first_model(logger,comment_text)
-            second_model_processed = False
-
-            # If result is unclear, run fallback
-            if sentiment_result.lower() in ["no sentiment expressed", "mixed", "neutral"]:
-                logger.debug(f"Running second model for comment_id: {comment_id}")
-                second_model_result = run_second_model(logger,comment_text)
-
-                if second_model_result == "NEGATIVE" and comment_rating == 1:
-                    sentiment_result = "negative"
-                    second_model_processed = True
-                    print("second_model is used")
-                elif second_model_result == "POSITIVE" and comment_rating == 5:
-                    sentiment_result = "positive"
-                    second_model_processed = True
-                    print("second_model is used")
-            SENTIMENT_SCORES = {
-                        "very negative": 1,
-                        "negative": 2,
-                        "neutral": 3,
-                        "mixed": 3,
-                        "positive": 4,
-                        "very positive": 5,
-                        "no sentiment expressed": 3
-                    }
-            sentiment_result, sentiment_score = validate_and_score_sentiment(logger,sentiment_result,comment_text,SENTIMENT_SCORES)
-            # sentiment_result, sentiment_score = validate_and_score_sentiment(logger,sentiment_result)
-            update_sentiment_dima (logger,comment_id, sentiment_result, sentiment_score, second_model_processed)
-
-            logger.info(f"Updated comment_id: {comment_id} with sentiment: {sentiment_result}, score: {sentiment_score}")
-        except Exception as e:
-            logger.error(f"Error processing comment_id: {comment_id}: {e}", exc_info=True)
-            update_sentiment_dima (logger,comment_id, "Missed Value", 11, False)
-            continue
-
-        time.sleep(0.3)
+        return run_sentiment_pipeline(
+            logger,
+            fetch_page=fetch_page,
+            score_page=score_page,
+            write_results=write_results,
+            queue_size=1
+        )
+    finally:
+        writer.close()
@@ -0,0 +1,89 @@
+# Repetitive detection benchmark
+# Compares the per-row loop (mark_repetitive_loop) with the vectorized pandas version
+# (mark_repetitive_vectorized) on a synthetic dima_comments frame, checks that both give
+# the same is_repetitive / duplicate_of for every row and writes one JSON report.
+#
+# usage: python benchmark_repetitive.py [--comments 200000] [--users 20000] [--output results/bench.json]
+import argparse
+import json
+import os
+import random
+import time
+from datetime import datetime, timedelta
+import pandas as pd
+from repetitive_detection import normalize_comments_frame, mark_repetitive_loop, mark_repetitive_vectorized
+
+TEXTS = [
+    "برنامه خیلی کند است", "پرداخت انجام نشد", "عالی", "ممنون از پشتیبانی",
+    "رمز پویا نمیاد", "  برنامه   خیلی کند است ", "خوب", "انتقال وجه خطا میده",
+]
+TITLES = ["پرداخت قبض", "انتقال وجه", "ورود", None]
+
+
+def synthetic_comments(size, users, seed=42):
+    """
+    Deterministic frame shaped like the dima_comments query: users post bursts of the
+    same comment (some within an hour, some spread over hours) mixed with other comments.
+    """
+    rng = random.Random(seed)
+    start = datetime(2025, 1, 1)
+    rows = []
+    comment_id = 0
+    while comment_id < size:
+        user = f"user-{rng.randrange(users)}"
+        moment = start + timedelta(minutes=rng.randrange(60 * 24 * 365))
+        text, title = rng.choice(TEXTS), rng.choice(TITLES)
+        for _ in range(rng.choice([1, 1, 1, 2, 3, 6])):
+            comment_id += 1
+            if rng.random() < 0.15:
+                text = rng.choice(TEXTS)
+            rows.append((comment_id, user, title, text, moment, None))
+            moment += timedelta(minutes=rng.choice([0, 5, 20, 45, 59, 61, 90, 180]))
+    return pd.DataFrame(rows, columns=["id", "national_code_hash", "title", "description", "created_at", "sentiment_result"])
+
+
+def timed(func, df):
+    start = time.perf_counter()
+    result = func(df.copy())
+    return result, round(time.perf_counter() - start, 3)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Repetitive detection benchmark (loop vs vectorized)")
+    parser.add_argument("--comments", type=int, default=200000, help="size of the synthetic frame")
+    parser.add_argument("--users", type=int, default=20000)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", default=None, help="JSON file (default results/bench_repetitive_<timestamp>.json)")
+    args = parser.parse_args()
+
+    df = normalize_comments_frame(synthetic_comments(args.comments, args.users, args.seed))
+    looped, loop_seconds = timed(mark_repetitive_loop, df)
+    vectorized, vectorized_seconds = timed(mark_repetitive_vectorized, df)
+
+    identical = (
+        looped["is_repetitive"].tolist() == vectorized["is_repetitive"].tolist()
+        and looped["duplicate_of"].tolist() == vectorized["duplicate_of"].tolist()
+    )
+    report = {
+        "comments": len(df),
+        "users": int(df["national_code_hash"].nunique()),
+        "flagged": int(vectorized["is_repetitive"].sum()),
+        "identical": identical,
+        "loop_seconds": loop_seconds,
+        "vectorized_seconds": vectorized_seconds,
+        "speedup": round(loop_seconds / vectorized_seconds, 1) if vectorized_seconds else None,
+    }
+    print(json.dumps(report, indent=2))
+
+    output = args.output or os.path.join("results", f"bench_repetitive_{datetime.now():%Y%m%d_%H%M%S}.json")
+    os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"✅ Report written to {output}")
+
+    if not identical:
+        raise SystemExit("❌ Vectorized output differs from the loop")
+
+
+if __name__ == "__main__":
+    main()
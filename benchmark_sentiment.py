@@ -0,0 +1,398 @@
+# Sentiment throughput / latency benchmark
+# Runs run_first_model, run_second_model (local stand-in translator) and the full
+# score_comments loop (the SentimentEngine scoring path) on a synthetic Persian corpus and writes one JSON
+# report: comments/sec, p50/p95 per-comment latency, peak RSS and the time split
+# between tokenize, generate, classify, translate and DB.
+#
+# usage: python benchmark_sentiment.py [--comments 300] [--postgres] [--output results/bench.json]
+import argparse
+import json
+import logging
+import os
+import random
+import resource
+import statistics
+import time
+from datetime import datetime
+
+# Measure the models, not the cache; --cache turns it back on
+os.environ.setdefault("SENTIMENT_CACHE", "0")
+
+POSITIVE_WORDS = ["عالی", "خوب", "ممنون", "راضی", "سریع", "کاربردی", "مرسی", "بهترین"]
+NEGATIVE_WORDS = ["بد", "افتضاح", "ضعیف", "کند", "خراب", "ناراضی", "مشکل", "خطا"]
+NEUTRAL_WORDS = [
+    "برنامه", "اپلیکیشن", "پرداخت", "ورود", "حساب", "پشتیبانی", "نسخه", "جدید",
+    "قبض", "کارت", "انتقال", "وجه", "رمز", "پیامک", "بانک", "شارژ", "موجودی",
+]
+FILLER_WORDS = ["خیلی", "واقعا", "اصلا", "همیشه", "بعد از", "به روز رسانی", "نمیشه", "است", "بود", "هست", "و", "که"]
+RULE_PHRASES = ["عالیه", "حرف نداره", "معمولی", "نظری ندارم", "خیلی خوبه"]
+
+
+def synthetic_corpus(size, seed=42):
+    """
+    Deterministic (id, description, grade) rows shaped like dima_comments:
+    mostly short comments, some paragraphs, phrase-rule comments, exact repeats and empties.
+    """
+    rng = random.Random(seed)
+    rows = []
+    for comment_id in range(1, size + 1):
+        grade = rng.randint(1, 5)
+        kind = rng.random()
+        if kind < 0.03:
+            text = ""
+        elif kind < 0.13:
+            text = rng.choice(RULE_PHRASES)
+        elif kind < 0.23 and rows:
+            text = rng.choice(rows)[1]
+        else:
+            sentiment_words = POSITIVE_WORDS if grade >= 4 else NEGATIVE_WORDS if grade <= 2 else POSITIVE_WORDS + NEGATIVE_WORDS
+            length = rng.choice([rng.randint(1, 8)] * 6 + [rng.randint(9, 40)] * 3 + [rng.randint(41, 200)])
+            words = [
+                rng.choice(sentiment_words) if rng.random() < 0.2 else rng.choice(NEUTRAL_WORDS + FILLER_WORDS)
+                for _ in range(length)
+            ]
+            # sentence breaks so long comments exercise the sentence-boundary cap
+            text = " ".join(word + ("." if i % 12 == 11 else "") for i, word in enumerate(words))
+        rows.append((comment_id, text, grade))
+    return rows
+
+
+class CostTimers:
+    def __init__(self):
+        self.seconds = {}
+
+    def add(self, name, seconds):
+        self.seconds[name] = self.seconds.get(name, 0.0) + seconds
+
+    def reset(self):
+        self.seconds = {}
+
+    def report(self, wall_seconds):
+        split = {name: round(value, 3) for name, value in sorted(self.seconds.items())}
+        split["other"] = round(max(wall_seconds - sum(self.seconds.values()), 0.0), 3)
+        return split
+
+
+class TimedProxy:
+    """Forward every attribute to obj; calls of the methods in `methods` are timed under `name`."""
+
+    def __init__(self, obj, timers, name, methods=()):
+        self._obj = obj
+        self._timers = timers
+        self._name = name
+        self._methods = set(methods)
+
+    def _timed(self, func):
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                self._timers.add(self._name, time.perf_counter() - start)
+        return wrapper
+
+    def __call__(self, *args, **kwargs):
+        return self._timed(self._obj)(*args, **kwargs)
+
+    def __getattr__(self, attr):
+        value = getattr(self._obj, attr)
+        if attr in self._methods:
+            return self._timed(value)
+        return value
+
+
+class InMemoryCursor:
+    """Enough of a psycopg2 cursor for SentimentWriter (execute_values, row-by-row fallback)."""
+
+    def __init__(self, conn):
+        self.conn = conn
+        self.connection = conn
+        self._result = []
+
+    def mogrify(self, template, args):
+        self.conn.rows_written += 1
+        return repr(tuple(args)).encode("utf-8")
+
+    def execute(self, query, params=None):
+        if self.conn.latency:
+            time.sleep(self.conn.latency)
+        self._result = []
+
+    def fetchone(self):
+        return self._result[0] if self._result else None
+
+    def fetchall(self):
+        return self._result
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+class InMemoryConnection:
+    """Postgres stand-in that accepts the writer's statements and sleeps latency seconds per round trip."""
+
+    encoding = "UTF8"
+
+    def __init__(self, latency=0.0):
+        self.latency = latency
+        self.closed = False
+        self.rows_written = 0
+
+    def cursor(self):
+        return InMemoryCursor(self)
+
+    def commit(self):
+        if self.latency:
+            time.sleep(self.latency)
+
+    def rollback(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+
+def percentile(values, fraction):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))]
+
+
+def peak_rss_mb():
+    # ru_maxrss is in kilobytes on Linux
+    return round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+
+
+def summarize(name, comments, wall_seconds, latencies, timers):
+    return {
+        "benchmark": name,
+        "comments": comments,
+        "seconds": round(wall_seconds, 3),
+        "comments_per_second": round(comments / wall_seconds, 2) if wall_seconds else 0.0,
+        "latency_p50_ms": round(percentile(latencies, 0.5) * 1000, 1),
+        "latency_p95_ms": round(percentile(latencies, 0.95) * 1000, 1),
+        "latency_mean_ms": round(statistics.mean(latencies) * 1000, 1) if latencies else 0.0,
+        "cost_split_seconds": timers.report(wall_seconds),
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+
+def instrument_models(timers):
+    """Swap the loaded models for timed proxies (tokenize / generate / classify / translate)."""
+    from cafe_bazar_app import sentiment_model_func, translation_func
+    from cafe_bazar_app.translation_func import LocalStandInTranslator
+
+    # set before loading so load_models never builds the network translator
+    translator = TimedProxy(LocalStandInTranslator(), timers, "translate", ("translate", "translate_batch"))
+    translation_func.set_translator(translator)
+    tokenizer, model, classifier, _ = sentiment_model_func.get_models()
+    sentiment_model_func._models = (
+        TimedProxy(tokenizer, timers, "tokenize", ("encode", "decode", "batch_decode")),
+        TimedProxy(model, timers, "generate", ("generate",)),
+        TimedProxy(classifier, timers, "classify"),
+        translator,
+    )
+
+
+def bench_first_model(logger, corpus, timers):
+    from cafe_bazar_app.sentiment_model_func import run_first_model
+    texts = [text for _, text, _ in corpus if text.strip()]
+    timers.reset()
+    latencies = []
+    start = time.perf_counter()
+    for text in texts:
+        t0 = time.perf_counter()
+        run_first_model(logger, text)
+        latencies.append(time.perf_counter() - t0)
+    return summarize("run_first_model", len(texts), time.perf_counter() - start, latencies, timers)
+
+
+def bench_second_model(logger, corpus, timers):
+    from cafe_bazar_app.sentiment_model_func import run_second_model
+    texts = [text for _, text, _ in corpus if text.strip()]
+    timers.reset()
+    latencies = []
+    start = time.perf_counter()
+    for text in texts:
+        t0 = time.perf_counter()
+        run_second_model(logger, text)
+        latencies.append(time.perf_counter() - t0)
+    return summarize("run_second_model", len(texts), time.perf_counter() - start, latencies, timers)
+
+
+def bench_full_loop(logger, corpus, timers, page_size, batch_size, source, fetch_page):
+    """
+    fetch -> score_comments -> flush, page by page, the same scoring path SentimentEngine
+    runs. Every comment of a page gets the page's wall time as its latency (that is when
+    its row is committed).
+    """
+    from cafe_bazar_app.sentiment_engine import score_comments
+    from cafe_bazar_app.sentiment_writer import SentimentWriter
+
+    class TimedWriter(SentimentWriter):
+        def flush(self):
+            t0 = time.perf_counter()
+            try:
+                super().flush()
+            finally:
+                timers.add("db", time.perf_counter() - t0)
+
+    timers.reset()
+    writer = TimedWriter(logger, source.connect, source.table, source.id_column, flush_size=page_size, flush_interval=3600)
+    latencies = []
+    processed = 0
+    start = time.perf_counter()
+    after_id = None
+    while True:
+        t0 = time.perf_counter()
+        rows = fetch_page(after_id, page_size)
+        timers.add("db", time.perf_counter() - t0)
+        if not rows:
+            break
+        after_id = rows[-1][0]
+        results, _ = score_comments(logger, [(source,) + tuple(row) for row in rows], batch_size=batch_size)
+        for _, *result in results:
+            writer.add(*result)
+        writer.flush()
+        latencies.extend([time.perf_counter() - t0] * len(rows))
+        processed += len(rows)
+    writer.close()
+    return summarize("score_comments", processed, time.perf_counter() - start, latencies, timers)
+
+
+def setup_postgres_table(corpus):
+    """Copy the corpus into bench_dima_comments on the database from .env (dropped afterwards)."""
+    from psycopg2.extras import execute_values
+    from connect_to_database_func import connect_db
+    conn = connect_db()
+    with conn.cursor() as cursor:
+        cursor.execute("""
+            DROP TABLE IF EXISTS bench_dima_comments;
+            CREATE TABLE bench_dima_comments (
+                id INTEGER PRIMARY KEY,
+                description TEXT,
+                grade INTEGER,
+                sentiment_result TEXT,
+                sentiment_score INTEGER,
+                second_model_processed BOOLEAN,
+                sentiment_source TEXT,
+                sentiment_version TEXT
+            );
+        """)
+        execute_values(cursor, "INSERT INTO bench_dima_comments (id, description, grade) VALUES %s", corpus)
+    conn.commit()
+    conn.close()
+
+
+def drop_postgres_table():
+    from connect_to_database_func import connect_db
+    conn = connect_db()
+    with conn.cursor() as cursor:
+        cursor.execute("DROP TABLE IF EXISTS bench_dima_comments;")
+    conn.commit()
+    conn.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Sentiment throughput and latency benchmark")
+    parser.add_argument("--comments", type=int, default=300, help="size of the synthetic corpus")
+    parser.add_argument("--single", type=int, default=50, help="comments for the one-by-one model benchmarks")
+    parser.add_argument("--page-size", type=int, default=100)
+    parser.add_argument("--batch-size", type=int, default=None)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--postgres", action="store_true", help="use the database from .env instead of the in-memory stand-in")
+    parser.add_argument("--db-latency-ms", type=float, default=1.0, help="round-trip latency of the in-memory stand-in")
+    parser.add_argument("--cache", action="store_true", help="keep the sentiment cache enabled")
+    parser.add_argument("--output", default=None, help="JSON file (default results/bench_sentiment_<timestamp>.json)")
+    args = parser.parse_args()
+
+    if args.cache:
+        os.environ["SENTIMENT_CACHE"] = "1"
+    logging.basicConfig(level=logging.WARNING)
+    logger = logging.getLogger("sentiment_benchmark")
+
+    from cafe_bazar_app.sentiment_model_func import INFERENCE_BACKEND, FIRST_MODEL_MODE, FIRST_MODEL_BATCH_SIZE
+    from cafe_bazar_app.sentiment_engine import SentimentSource, DIMA_SENTIMENT_SCORES
+
+    corpus = synthetic_corpus(args.comments, args.seed)
+    timers = CostTimers()
+
+    load_start = time.perf_counter()
+    instrument_models(timers)
+    load_seconds = time.perf_counter() - load_start
+
+    if args.postgres:
+        from connect_to_database_func import connect_db
+        setup_postgres_table(corpus)
+        connect = connect_db
+    else:
+        stand_in = InMemoryConnection(latency=args.db_latency_ms / 1000)
+
+        def connect():
+            return stand_in
+
+    source = SentimentSource(
+        "bench", "bench_dima_comments", "id", "description", "grade", DIMA_SENTIMENT_SCORES,
+        pending_filter="sentiment_result IS NULL", empty_result=("no comments", 0), connect=connect
+    )
+    if args.postgres:
+        def fetch_page(after_id, limit):
+            return source.fetch_pending(logger, limit=limit, after_id=after_id)
+    else:
+        def fetch_page(after_id, limit):
+            if stand_in.latency:
+                time.sleep(stand_in.latency)
+            return [row for row in corpus if after_id is None or row[0] > after_id][:limit]
+
+    try:
+        single = corpus[:args.single]
+        report = {
+            "started_at": datetime.now().isoformat(timespec="seconds"),
+            "config": {
+                "comments": args.comments,
+                "single_comments": len(single),
+                "page_size": args.page_size,
+                "batch_size": args.batch_size or FIRST_MODEL_BATCH_SIZE,
+                "seed": args.seed,
+                "database": "postgres" if args.postgres else f"in-memory ({args.db_latency_ms} ms round trip)",
+                "backend": INFERENCE_BACKEND,
+                "first_model_mode": FIRST_MODEL_MODE,
+                "cache": os.environ["SENTIMENT_CACHE"] != "0",
+                "translator": "local stand-in",
+            },
+            "model_load_seconds": round(load_seconds, 2),
+            "benchmarks": [
+                bench_first_model(logger, single, timers),
+                bench_second_model(logger, single, timers),
+                bench_full_loop(logger, corpus, timers, args.page_size, args.batch_size, source, fetch_page),
+            ],
+            "peak_rss_mb": peak_rss_mb(),
+        }
+    finally:
+        if args.postgres:
+            drop_postgres_table()
+
+    output = args.output or os.path.join("results", f"bench_sentiment_{datetime.now():%Y%m%d_%H%M%S}.json")
+    directory = os.path.dirname(output)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+
+    for result in report["benchmarks"]:
+        print(
+            f"{result['benchmark']:<30} {result['comments_per_second']:>8} comments/s  "
+            f"p50 {result['latency_p50_ms']} ms  p95 {result['latency_p95_ms']} ms  split {result['cost_split_seconds']}"
+        )
+    print(f"peak RSS {report['peak_rss_mb']} MB, report written to {output}")
+
+
+if __name__ == "__main__":
+    main()
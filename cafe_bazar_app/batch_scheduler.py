@@ -0,0 +1,95 @@
+# Length-bucketed batch scheduling for sentiment inference
+# Comments are sorted by token length and grouped under a padded-token budget, so
+# short comments are not padded up to the length of an essay in the same batch.
+# Results are always returned in the original input order.
+import os
+from preprocessing_func import _SENT_SPLIT
+
+# Maximum padded tokens per batch (batch size x longest comment in the batch)
+SENTIMENT_TOKEN_BUDGET = int(os.getenv("SENTIMENT_TOKEN_BUDGET", "4096"))
+# Comments longer than this are capped at a sentence boundary
+SENTIMENT_MAX_COMMENT_TOKENS = int(os.getenv("SENTIMENT_MAX_COMMENT_TOKENS", "256"))
+
+
+def token_lengths(tokenizer, texts):
+    """Token count of every text (without special tokens)."""
+    if not texts:
+        return []
+    return [len(ids) for ids in tokenizer(list(texts), add_special_tokens=False)["input_ids"]]
+
+
+def cap_text(tokenizer, text, max_tokens=None):
+    """
+    Keep whole sentences from the start of a long comment while they fit in max_tokens.
+    A first sentence that is longer than max_tokens on its own is cut at the token limit.
+    """
+    max_tokens = max_tokens or SENTIMENT_MAX_COMMENT_TOKENS
+    sentences = [s.strip() for s in _SENT_SPLIT.split(text) if s.strip()]
+    if not sentences:
+        return text
+    lengths = token_lengths(tokenizer, sentences)
+
+    kept = []
+    used = 0
+    for sentence, length in zip(sentences, lengths):
+        if used + length > max_tokens:
+            break
+        kept.append(sentence)
+        used += length
+    if kept:
+        return " ".join(kept)
+
+    ids = tokenizer(sentences[0], add_special_tokens=False)["input_ids"][:max_tokens]
+    return tokenizer.decode(ids, skip_special_tokens=True)
+
+
+def plan_batches(lengths, token_budget=None, max_batch_size=None):
+    """
+    Group indices into batches in ascending length order. A batch grows while
+    (batch size x longest length) stays within token_budget and, when given,
+    the batch holds at most max_batch_size items. Returns a list of index lists.
+    """
+    token_budget = token_budget or SENTIMENT_TOKEN_BUDGET
+    batches = []
+    batch = []
+    longest = 0
+    for i in sorted(range(len(lengths)), key=lambda i: lengths[i]):
+        length = max(lengths[i], 1)
+        full = max_batch_size and len(batch) >= max_batch_size
+        if batch and (full or (len(batch) + 1) * max(longest, length) > token_budget):
+            batches.append(batch)
+            batch = []
+            longest = 0
+        batch.append(i)
+        longest = max(longest, length)
+    if batch:
+        batches.append(batch)
+    return batches
+
+
+def run_in_token_batches(logger, tokenizer, texts, run_batch, token_budget=None, max_batch_size=None, max_tokens=None, extra_tokens=0):
+    """
+    Cap long texts, plan length-bucketed batches and call run_batch(list_of_texts)
+    for each batch. run_batch must return one result per text; the combined
+    results are returned in the order of texts.
+    extra_tokens is added to every length when planning (e.g. a fixed question suffix).
+    """
+    max_tokens = max_tokens or SENTIMENT_MAX_COMMENT_TOKENS
+    texts = list(texts)
+    lengths = token_lengths(tokenizer, texts)
+    for i, length in enumerate(lengths):
+        if length > max_tokens:
+            texts[i] = cap_text(tokenizer, texts[i], max_tokens)
+            lengths[i] = min(token_lengths(tokenizer, [texts[i]])[0], max_tokens)
+            logger.debug(f"Capped a comment of {length} tokens to {lengths[i]} tokens")
+
+    results = [None] * len(texts)
+    batches = plan_batches([length + extra_tokens for length in lengths], token_budget, max_batch_size)
+    for batch in batches:
+        output = run_batch([texts[i] for i in batch])
+        if len(output) != len(batch):
+            raise ValueError(f"Batch returned {len(output)} results for {len(batch)} texts.")
+        for i, result in zip(batch, output):
+            results[i] = result
+    logger.debug(f"Scheduled {len(texts)} texts into {len(batches)} length-bucketed batches")
+    return results
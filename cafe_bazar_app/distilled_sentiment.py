@@ -0,0 +1,146 @@
+# Distilled first-tier sentiment classifier
+# A TF-IDF char n-gram + logistic regression model trained on the MT5 labels already
+# stored in dima_comments. In the cascade, comments it labels with a probability above
+# DISTILLED_THRESHOLD skip MT5; everything else still goes to the transformer.
+import hashlib
+import os
+import threading
+import time
+from collections import Counter
+import joblib
+from sklearn.feature_extraction.text import TfidfVectorizer
+from sklearn.linear_model import LogisticRegression
+from sklearn.model_selection import train_test_split
+from sklearn.pipeline import Pipeline
+from .sentiment_cache import normalize_cache_text
+
+DISTILLED_MODEL_PATH = os.getenv("SENTIMENT_DISTILLED_PATH", "cache/distilled_sentiment.joblib")
+DISTILLED_THRESHOLD = float(os.getenv("SENTIMENT_DISTILLED_THRESHOLD", "0.9"))
+# Set SENTIMENT_DISTILLED=0 to always run MT5 even when a trained model exists
+DISTILLED_ENABLED = os.getenv("SENTIMENT_DISTILLED", "1") != "0"
+
+
+def build_distilled_pipeline():
+    return Pipeline([
+        ("tfidf", TfidfVectorizer(
+            analyzer="char_wb",
+            ngram_range=(2, 5),
+            min_df=2,
+            sublinear_tf=True,
+            preprocessor=normalize_cache_text
+        )),
+        ("clf", LogisticRegression(max_iter=1000, C=4.0)),
+    ])
+
+
+def predict_with_confidence(pipeline, texts):
+    """Return (label, probability) of the most likely class for every text."""
+    if not texts:
+        return []
+    probabilities = pipeline.predict_proba(texts)
+    classes = pipeline.classes_
+    best = probabilities.argmax(axis=1)
+    return [(classes[i], float(row[i])) for i, row in zip(best, probabilities)]
+
+
+def agreement_report(pipeline, texts, labels, threshold=None):
+    """
+    Agreement with the MT5 labels on a labelled set: overall, per label, and on the
+    part of the set the cascade would actually answer (probability >= threshold).
+    """
+    threshold = threshold if threshold is not None else DISTILLED_THRESHOLD
+    predictions = predict_with_confidence(pipeline, texts)
+    total = len(labels)
+    agree = sum(label == predicted for label, (predicted, _) in zip(labels, predictions))
+
+    confident = [(label, predicted) for label, (predicted, prob) in zip(labels, predictions) if prob >= threshold]
+    confident_agree = sum(label == predicted for label, predicted in confident)
+
+    per_label = {}
+    for label, (predicted, _) in zip(labels, predictions):
+        counts = per_label.setdefault(label, {"count": 0, "agree": 0})
+        counts["count"] += 1
+        counts["agree"] += label == predicted
+    for counts in per_label.values():
+        counts["agreement"] = round(counts["agree"] / counts["count"], 4)
+
+    return {
+        "samples": total,
+        "agreement": round(agree / total, 4) if total else 0.0,
+        "threshold": threshold,
+        "coverage": round(len(confident) / total, 4) if total else 0.0,
+        "confident_agreement": round(confident_agree / len(confident), 4) if confident else 0.0,
+        "per_label": per_label,
+    }
+
+
+def train_distilled_model(logger, texts, labels, holdout=0.2, threshold=None, random_state=42):
+    """
+    Fit the distilled classifier on (comment, MT5 label) pairs and report agreement
+    on a stratified holdout. Returns {"pipeline", "version", "report"}.
+    """
+    # stratified split needs at least two examples of every label
+    counts = Counter(labels)
+    pairs = [(text, label) for text, label in zip(texts, labels) if counts[label] >= 2]
+    texts, labels = [text for text, _ in pairs], [label for _, label in pairs]
+    logger.info(f"Training distilled sentiment model on {len(texts)} labelled comments")
+    train_texts, test_texts, train_labels, test_labels = train_test_split(
+        texts, labels, test_size=holdout, random_state=random_state, stratify=labels
+    )
+    start = time.time()
+    pipeline = build_distilled_pipeline()
+    pipeline.fit(train_texts, train_labels)
+    report = agreement_report(pipeline, test_texts, test_labels, threshold)
+    report["train_samples"] = len(train_texts)
+    report["train_seconds"] = round(time.time() - start, 1)
+    logger.info(
+        f"Distilled model holdout agreement {report['agreement']:.2%}; at threshold {report['threshold']} "
+        f"it answers {report['coverage']:.2%} of comments with {report['confident_agreement']:.2%} agreement"
+    )
+    version = hashlib.sha256(f"{len(texts)}:{time.time()}".encode("utf-8")).hexdigest()[:12]
+    return {"pipeline": pipeline, "version": version, "report": report}
+
+
+def save_distilled_model(model, path=None):
+    path = path or DISTILLED_MODEL_PATH
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    joblib.dump(model, path)
+
+
+_model = None
+_model_loaded = False
+_model_lock = threading.Lock()
+
+
+def get_distilled_model():
+    """Shared trained model loaded once from DISTILLED_MODEL_PATH; None when disabled or not trained."""
+    global _model, _model_loaded
+    if not DISTILLED_ENABLED:
+        return None
+    if not _model_loaded:
+        with _model_lock:
+            if not _model_loaded:
+                _model = joblib.load(DISTILLED_MODEL_PATH) if os.path.exists(DISTILLED_MODEL_PATH) else None
+                _model_loaded = True
+    return _model
+
+
+def run_distilled_tier(logger, texts, threshold=None):
+    """
+    Label the texts the distilled model is confident about.
+    Returns one label per text, None where MT5 still has to run.
+    """
+    threshold = threshold if threshold is not None else DISTILLED_THRESHOLD
+    model = get_distilled_model()
+    if model is None or not texts:
+        return [None] * len(texts)
+    try:
+        predictions = predict_with_confidence(model["pipeline"], texts)
+    except Exception as e:
+        logger.error(f"Error in distilled sentiment model, using MT5 for all comments: {e}", exc_info=False)
+        return [None] * len(texts)
+    labels = [label if probability >= threshold else None for label, probability in predictions]
+    logger.info(f"Distilled model answered {sum(label is not None for label in labels)} of {len(texts)} comments")
+    return labels
@@ -0,0 +1,118 @@
+# Cached MT5 input encoding
+# Every MT5 input is "<comment><sep><question>". The question suffix is encoded once,
+# comment bodies are batch-encoded and kept in a small LRU, and the ids are joined
+# and padded here instead of re-tokenizing the whole string for every call.
+import os
+import threading
+from collections import OrderedDict
+import torch
+
+TOKEN_CACHE_SIZE = int(os.getenv("SENTIMENT_TOKEN_CACHE_SIZE", "4096"))
+
+# Comments used to check once that body + suffix ids equal the ids of the joined string
+_PROBE_TEXTS = ["عالی", "برنامه خوبیه.", "خیلی کند است!", "ok", "پرداخت انجام نشد؟"]
+
+
+class MT5InputEncoder:
+    """
+    encode(contexts) returns padded input_ids/attention_mask tensors, identical to
+    tokenizer([c + "<sep>" + text_b for c in contexts], return_tensors="pt", padding=True).
+    If the split encoding does not reproduce the joined one for this tokenizer,
+    the encoder falls back to plain tokenizer calls (self.exact is False).
+
+    Calling the encoder like a tokenizer with add_special_tokens=False returns the
+    cached body ids, so batch_scheduler can count tokens from the same cache.
+    """
+
+    def __init__(self, tokenizer, text_b, cache_size=None):
+        self.tokenizer = tokenizer
+        self.text_b = text_b
+        self.cache_size = cache_size or TOKEN_CACHE_SIZE
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+        self.eos_ids = [tokenizer.eos_token_id] if tokenizer.eos_token_id is not None else []
+        self.pad_id = tokenizer.pad_token_id if tokenizer.pad_token_id is not None else 0
+        # suffix ids as they appear after a comment: encode "a<sep>..." and drop the ids of "a"
+        anchor = tokenizer("a", add_special_tokens=False)["input_ids"]
+        joined = tokenizer("a<sep>" + text_b, add_special_tokens=False)["input_ids"]
+        self.suffix_ids = joined[len(anchor):] if joined[:len(anchor)] == anchor else None
+        self.exact = self.suffix_ids is not None and all(
+            self._join(body) == tokenizer(text + "<sep>" + text_b)["input_ids"]
+            for text, body in zip(_PROBE_TEXTS, tokenizer(_PROBE_TEXTS, add_special_tokens=False)["input_ids"])
+        )
+
+    def _join(self, body_ids):
+        return list(body_ids) + self.suffix_ids + self.eos_ids
+
+    def body_ids(self, texts):
+        """Token ids of every text without special tokens; cached texts are not re-encoded."""
+        result = [None] * len(texts)
+        missing = {}
+        with self._lock:
+            for i, text in enumerate(texts):
+                if text in self._cache:
+                    self._cache.move_to_end(text)
+                    result[i] = self._cache[text]
+                    self.hits += 1
+                else:
+                    missing.setdefault(text, []).append(i)
+        if missing:
+            encoded = self.tokenizer(list(missing), add_special_tokens=False)["input_ids"]
+            with self._lock:
+                for text, ids in zip(missing, encoded):
+                    ids = tuple(ids)
+                    self.misses += 1
+                    self._cache[text] = ids
+                    self._cache.move_to_end(text)
+                    for i in missing[text]:
+                        result[i] = ids
+                while len(self._cache) > self.cache_size:
+                    self._cache.popitem(last=False)
+        return result
+
+    def encode(self, contexts):
+        if not self.exact:
+            return self.tokenizer(
+                [context + "<sep>" + self.text_b for context in contexts],
+                return_tensors="pt",
+                padding=True
+            )
+        sequences = [self._join(ids) for ids in self.body_ids(list(contexts))]
+        longest = max(len(ids) for ids in sequences)
+        if getattr(self.tokenizer, "padding_side", "right") == "left":
+            input_ids = [[self.pad_id] * (longest - len(ids)) + ids for ids in sequences]
+            attention_mask = [[0] * (longest - len(ids)) + [1] * len(ids) for ids in sequences]
+        else:
+            input_ids = [ids + [self.pad_id] * (longest - len(ids)) for ids in sequences]
+            attention_mask = [[1] * len(ids) + [0] * (longest - len(ids)) for ids in sequences]
+        return {
+            "input_ids": torch.tensor(input_ids, dtype=torch.long),
+            "attention_mask": torch.tensor(attention_mask, dtype=torch.long),
+        }
+
+    def __call__(self, texts, add_special_tokens=True, **kwargs):
+        if add_special_tokens or kwargs:
+            return self.tokenizer(texts, add_special_tokens=add_special_tokens, **kwargs)
+        if isinstance(texts, str):
+            return {"input_ids": list(self.body_ids([texts])[0])}
+        return {"input_ids": [list(ids) for ids in self.body_ids(list(texts))]}
+
+    def decode(self, *args, **kwargs):
+        return self.tokenizer.decode(*args, **kwargs)
+
+    def batch_decode(self, *args, **kwargs):
+        return self.tokenizer.batch_decode(*args, **kwargs)
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "exact": self.exact,
+                "fast_tokenizer": bool(getattr(self.tokenizer, "is_fast", False)),
+                "lookups": lookups,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "cached_texts": len(self._cache),
+            }
@@ -0,0 +1,116 @@
+# Phrase rules for sentiment: fixed phrases that decide the label without any model
+# Rules are read from a JSON file {label: [phrases]}; earlier labels win on conflicts.
+import hashlib
+import json
+import os
+import threading
+from collections import deque
+from .sentiment_cache import normalize_cache_text
+
+DEFAULT_RULES_PATH = os.path.join(os.path.dirname(__file__), "sentiment_phrase_rules.json")
+
+
+class AhoCorasick:
+    """Minimal Aho–Corasick automaton: finds every pattern occurring in a text in one pass."""
+
+    def __init__(self, patterns):
+        # patterns: {pattern: value}
+        self._goto = [{}]
+        self._fail = [0]
+        self._output = [[]]
+
+        for pattern, value in patterns.items():
+            state = 0
+            for char in pattern:
+                if char not in self._goto[state]:
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._output.append([])
+                    self._goto[state][char] = len(self._goto) - 1
+                state = self._goto[state][char]
+            self._output[state].append(value)
+
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, next_state in self._goto[state].items():
+                queue.append(next_state)
+                fail = self._fail[state]
+                while fail and char not in self._goto[fail]:
+                    fail = self._fail[fail]
+                self._fail[next_state] = self._goto[fail].get(char, 0)
+                self._output[next_state] = self._output[next_state] + self._output[self._fail[next_state]]
+
+    def find(self, text):
+        state = 0
+        found = []
+        for char in text:
+            while state and char not in self._goto[state]:
+                state = self._fail[state]
+            state = self._goto[state].get(char, 0)
+            found.extend(self._output[state])
+        return found
+
+
+class PhraseRuleEngine:
+    """
+    Precompiled phrase rules.
+    mode="exact": the whole normalized comment must equal a phrase (set lookup).
+    mode="substring": any phrase occurring inside the comment matches (Aho–Corasick).
+    """
+
+    def __init__(self, rules, mode="exact"):
+        if mode not in ("exact", "substring"):
+            raise ValueError(f"Unknown phrase rule mode: {mode}")
+        self.mode = mode
+        self.labels = list(rules)
+        self._phrase_labels = {}
+        for label in self.labels:
+            for phrase in rules[label]:
+                # first label listed for a phrase wins
+                self._phrase_labels.setdefault(normalize_cache_text(phrase), label)
+        self._automaton = AhoCorasick(self._phrase_labels) if mode == "substring" else None
+        self.version = hashlib.sha256(
+            json.dumps([mode, rules], ensure_ascii=False, sort_keys=True).encode("utf-8")
+        ).hexdigest()[:12]
+
+    @classmethod
+    def from_file(cls, path=DEFAULT_RULES_PATH, mode="exact"):
+        with open(path, "r", encoding="utf-8") as f:
+            return cls(json.load(f), mode=mode)
+
+    def match(self, text):
+        """Return the rule label for this comment, or None when no rule applies."""
+        if not isinstance(text, str):
+            return None
+        normalized = normalize_cache_text(text)
+        if self._automaton is None:
+            return self._phrase_labels.get(normalized)
+        found = self._automaton.find(normalized)
+        if not found:
+            return None
+        return min(found, key=self.labels.index)
+
+
+_engine = None
+_engine_lock = threading.Lock()
+
+
+def get_phrase_rules():
+    """Shared engine built from SENTIMENT_PHRASE_RULES / SENTIMENT_PHRASE_MODE (loaded once)."""
+    global _engine
+    if _engine is None:
+        with _engine_lock:
+            if _engine is None:
+                _engine = PhraseRuleEngine.from_file(
+                    os.getenv("SENTIMENT_PHRASE_RULES", DEFAULT_RULES_PATH),
+                    mode=os.getenv("SENTIMENT_PHRASE_MODE", "exact")
+                )
+    return _engine
+
+
+def reload_phrase_rules():
+    """Drop the shared engine so the next call re-reads the rules file."""
+    global _engine
+    with _engine_lock:
+        _engine = None
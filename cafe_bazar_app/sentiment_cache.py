@@ -0,0 +1,169 @@
+# Content-addressed cache for sentiment model outputs
+# Two tiers: an in-memory LRU and a persistent local SQLite file.
+# Keys are a hash of (model version, normalized comment text), so a model
+# upgrade never serves stale labels.
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+from collections import OrderedDict
+
+
+def normalize_cache_text(text):
+    """Normalize a comment the same way duplicate detection does (trim + collapse spaces)."""
+    return re.sub(r"\s+", " ", str(text).strip())
+
+
+def make_cache_key(model_version, text):
+    normalized = normalize_cache_text(text)
+    return hashlib.sha256(f"{model_version}\x00{normalized}".encode("utf-8")).hexdigest()
+
+
+class SentimentCache:
+    def __init__(self, path="cache/sentiment_cache.sqlite3", max_memory_items=10000):
+        self.path = path
+        self.max_memory_items = max_memory_items
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self.memory_hits = 0
+        self.persistent_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        # Opened lazily, once per process: a connection opened before fork is never used
+        # (or closed) by the child, which opens its own on first lookup
+        self._conn = None
+        self._conn_pid = None
+        self._inherited_conns = []
+
+    def _connection(self):
+        # caller holds self._lock
+        if not self.path:
+            return None
+        if self._conn is not None and self._conn_pid == os.getpid():
+            return self._conn
+        if self._conn is not None:
+            # opened by the parent before fork; keep it referenced so it is not closed here
+            self._inherited_conns.append(self._conn)
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        busy_timeout_ms = int(os.getenv("SENTIMENT_CACHE_BUSY_TIMEOUT_MS", "30000"))
+        conn = sqlite3.connect(self.path, timeout=busy_timeout_ms / 1000, check_same_thread=False)
+        # WAL lets the sharded workers read while another one writes
+        conn.execute("PRAGMA journal_mode=WAL;")
+        conn.execute(f"PRAGMA busy_timeout={busy_timeout_ms};")
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS sentiment_cache (
+                cache_key TEXT PRIMARY KEY,
+                model_version TEXT NOT NULL,
+                result TEXT NOT NULL,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        """)
+        conn.commit()
+        self._conn = conn
+        self._conn_pid = os.getpid()
+        return conn
+
+    def _remember(self, key, value):
+        # caller holds self._lock
+        self._memory[key] = value
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_memory_items:
+            self._memory.popitem(last=False)
+            self.evictions += 1
+
+    def get(self, model_version, text):
+        key = make_cache_key(model_version, text)
+        with self._lock:
+            if key in self._memory:
+                self._memory.move_to_end(key)
+                self.memory_hits += 1
+                return self._memory[key]
+
+            conn = self._connection()
+            if conn is not None:
+                row = conn.execute(
+                    "SELECT result FROM sentiment_cache WHERE cache_key = ?;", (key,)
+                ).fetchone()
+                if row is not None:
+                    self.persistent_hits += 1
+                    self._remember(key, row[0])
+                    return row[0]
+
+            self.misses += 1
+            return None
+
+    def put(self, model_version, text, result):
+        self.put_many(model_version, [(text, result)])
+
+    def put_many(self, model_version, items):
+        rows = [(make_cache_key(model_version, text), model_version, result) for text, result in items]
+        if not rows:
+            return
+        with self._lock:
+            for key, _, result in rows:
+                self._remember(key, result)
+            conn = self._connection()
+            if conn is not None:
+                conn.executemany(
+                    "INSERT OR REPLACE INTO sentiment_cache (cache_key, model_version, result) VALUES (?, ?, ?);",
+                    rows
+                )
+                conn.commit()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.memory_hits + self.persistent_hits + self.misses
+            hits = self.memory_hits + self.persistent_hits
+            return {
+                "lookups": lookups,
+                "memory_hits": self.memory_hits,
+                "persistent_hits": self.persistent_hits,
+                "misses": self.misses,
+                "hit_rate": round(hits / lookups, 4) if lookups else 0.0,
+                "evictions": self.evictions,
+                "memory_items": len(self._memory),
+            }
+
+    def log_stats(self, logger):
+        s = self.stats()
+        logger.info(
+            f"Sentiment cache: {s['lookups']} lookups, hit rate {s['hit_rate']:.1%} "
+            f"(memory {s['memory_hits']}, persistent {s['persistent_hits']}), "
+            f"misses {s['misses']}, evictions {s['evictions']}, in memory {s['memory_items']}"
+        )
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_sentiment_cache():
+    """Shared cache instance configured from the environment; None when SENTIMENT_CACHE=0."""
+    global _cache
+    if os.getenv("SENTIMENT_CACHE", "1") == "0":
+        return None
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = SentimentCache(
+                    path=os.getenv("SENTIMENT_CACHE_PATH", "cache/sentiment_cache.sqlite3"),
+                    max_memory_items=int(os.getenv("SENTIMENT_CACHE_SIZE", "10000"))
+                )
+    return _cache
+
+
+_inherited_caches = []
+
+
+def reset_sentiment_cache():
+    """Forget the shared instance (used after fork so a child opens its own SQLite connection)."""
+    global _cache, _cache_lock
+    if _cache is not None:
+        # the parent's connection must not be closed from the child when the instance is collected
+        _inherited_caches.append(_cache)
+    _cache = None
+    _cache_lock = threading.Lock()
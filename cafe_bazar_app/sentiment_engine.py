@@ -0,0 +1,263 @@
+# Unified sentiment engine for every comment table
+# A SentimentSource adapter describes one table (id/text/rating columns, which rows are
+# pending, how labels map to scores). The engine drains all sources through one work
+# queue: pages mix rows from every source (and every app), so batching, caching, the
+# cascade and sharding apply the same way to Dima and Cafe Bazaar comments.
+from .connect_to_database_func import connect_db
+from .sentiment_model_func import run_first_tier, run_second_model_batch_cached, validate_and_score_sentiment, log_cache_stats
+from .sentiment_model_func import SECOND_MODEL_TRIGGER_LABELS, FIRST_MODEL_STAGE, SECOND_MODEL_STAGE, plan_sentiment_stages, apply_second_model
+from .sentiment_model_func import sentiment_fingerprint, new_cascade_stats, log_cascade_stats
+from .sentiment_model_func import EMPTY_SOURCE, PHRASE_RULE_SOURCE, DISTILLED_SOURCE, SECOND_MODEL_SOURCE, FAILED_SOURCE
+from .sentiment_writer import SentimentWriter
+from .sentiment_pipeline import run_sentiment_pipeline
+from .sentiment_sharding import run_sharded
+
+# Dima comments are scored 1..5
+DIMA_SENTIMENT_SCORES = {
+    "very negative": 1,
+    "negative": 2,
+    "neutral": 3,
+    "mixed": 3,
+    "positive": 4,
+    "very positive": 5,
+    "no sentiment expressed": 3
+}
+
+# Cafe Bazaar app comments are scored -2..2
+APP_SENTIMENT_SCORES = {
+    "very negative": -2,
+    "negative": -1,
+    "neutral": 0,
+    "mixed": 0,
+    "positive": 1,
+    "very positive": 2,
+    "no sentiment expressed": 0
+}
+
+
+class SentimentSource:
+    """
+    Adapter for one comment table.
+    pending_filter is the SQL condition for rows still to score; its %s placeholders
+    are filled from filter_params. empty_result=(label, score) is stored for empty
+    comments without running the models; None sends them through the cascade.
+    """
+
+    def __init__(self, name, table, id_column, text_column, rating_column, score_map,
+                 pending_filter, filter_params=(), empty_result=None, connect=connect_db):
+        self.name = name
+        self.table = table
+        self.id_column = id_column
+        self.text_column = text_column
+        self.rating_column = rating_column
+        self.score_map = score_map
+        self.pending_filter = pending_filter
+        self.filter_params = tuple(filter_params)
+        self.empty_result = empty_result
+        self.connect = connect
+
+    def fetch_pending(self, logger, limit=100, after_id=None, shard=None):
+        """Next page of pending (id, text, rating) rows after after_id (keyset), restricted to id % count = index for shard=(index, count)."""
+        try:
+            conn = self.connect()
+            cursor = conn.cursor()
+            shard_index, shard_count = shard if shard else (0, 1)
+            query = f"""
+                SELECT {self.id_column}, {self.text_column}, {self.rating_column}
+                FROM {self.table}
+                WHERE {self.pending_filter}
+                  AND {self.id_column} > %s
+                  AND {self.id_column} %% %s = %s
+                ORDER BY {self.id_column} ASC
+                LIMIT %s;
+            """
+            cursor.execute(query, self.filter_params + (after_id if after_id is not None else -1, shard_count, shard_index, limit))
+            rows = cursor.fetchall()
+            logger.info(f"Fetched {len(rows)} comments for analysis from {self.table}.")
+            cursor.close()
+            conn.close()
+            return rows
+        except Exception as e:
+            logger.error(f"Error fetching comments from {self.table}: {e}", exc_info=True)
+            return []
+
+    def writer(self, logger, version=None):
+        return SentimentWriter(logger, self.connect, self.table, self.id_column, version=version)
+
+
+def dima_source(connect=connect_db):
+    return SentimentSource(
+        "dima", "dima_comments", "id", "description", "grade", DIMA_SENTIMENT_SCORES,
+        pending_filter="(sentiment_result IS NULL OR sentiment_result = '')",
+        empty_result=("no comments", 0),
+        connect=connect
+    )
+
+
+def app_source(app_ids, connect=connect_db):
+    # one source for all apps, so comments of different apps share pages and batches
+    return SentimentSource(
+        "app_comments", "app_comments", "comment_id", "comment_text", "comment_rating", APP_SENTIMENT_SCORES,
+        pending_filter="app_id = ANY(%s) AND sentiment_score IS NULL",
+        filter_params=(list(app_ids),),
+        connect=connect
+    )
+
+
+def score_comments(logger, items, batch_size=None):
+    """
+    Score comments from any mix of sources without touching the database.
+    items: [(source, comment_id, comment_text, comment_rating)]
+    Returns ([(source, comment_id, sentiment_result, sentiment_score, second_model_processed, sentiment_source)], cascade stats)
+    where sentiment_source is the tier that produced the label (see sentiment_model_func).
+    """
+    results = []
+    stats = new_cascade_stats()
+    stats["comments"] = len(items)
+
+    def is_empty(source, comment_text):
+        return source.empty_result is not None and (not comment_text or comment_text.strip() == "")
+
+    # Plan per comment which stages can still change its label, before any work.
+    # Items are keyed by position because ids of different sources can collide.
+    plans = {
+        i: plan_sentiment_stages(comment_text, comment_rating)
+        for i, (source, _, comment_text, comment_rating) in enumerate(items)
+        if not is_empty(source, comment_text)
+    }
+    scored = [(i, items[i][2]) for i in plans if FIRST_MODEL_STAGE in plans[i]]
+    stats["phrase_rule_matched"] = len(plans) - len(scored)
+
+    # Distilled model first, then MT5 once for the rest of the planned comments (batched generate)
+    first_model_labels, first_model_sources = run_first_tier(
+        logger, [comment_text for _, comment_text in scored], batch_size=batch_size
+    )
+    stats["distilled_model_used"] = first_model_sources.count(DISTILLED_SOURCE)
+    stats["first_model_run"] = len(scored) - stats["distilled_model_used"]
+    first_model_results = dict(zip([i for i, _ in scored], first_model_labels))
+    label_sources = dict(zip([i for i, _ in scored], first_model_sources))
+
+    # Run the fallback model once for every comment MT5 left unclear (batched translation)
+    unclear = []
+    for i, comment_text in scored:
+        if first_model_results[i].lower() not in SECOND_MODEL_TRIGGER_LABELS:
+            stats["second_model_not_triggered"] += 1
+        elif SECOND_MODEL_STAGE not in plans[i]:
+            stats["second_model_skipped_by_plan"] += 1
+        else:
+            unclear.append((i, comment_text))
+    stats["second_model_run"] = len(unclear)
+    second_model_results = dict(zip(
+        [i for i, _ in unclear],
+        run_second_model_batch_cached(logger, [comment_text for _, comment_text in unclear])
+    ))
+
+    for i, (source, comment_id, comment_text, comment_rating) in enumerate(items):
+        try:
+            logger.info(f"Analyzing sentiment for comment_id: {comment_id} from {source.table}")
+
+            # Handle empty or whitespace-only comment
+            if is_empty(source, comment_text):
+                sentiment_result, sentiment_score = source.empty_result
+                logger.info(f"Comment {comment_id} is empty — marked as '{sentiment_result}'")
+                results.append((source, comment_id, sentiment_result, sentiment_score, False, EMPTY_SOURCE))
+                continue
+
+            # Phrase-rule comments skipped the models and get their label in validate_and_score_sentiment
+            sentiment_result = first_model_results.get(i, "no sentiment expressed")
+            sentiment_source = label_sources.get(i, PHRASE_RULE_SOURCE)
+            second_model_processed = False
+
+            # If result is unclear, use the fallback result computed above
+            if i in second_model_results:
+                logger.debug(f"Using second model result for comment_id: {comment_id}")
+                sentiment_result, second_model_processed = apply_second_model(sentiment_result, second_model_results[i], comment_rating)
+                if second_model_processed:
+                    sentiment_source = SECOND_MODEL_SOURCE
+
+            sentiment_result, sentiment_score = validate_and_score_sentiment(logger, sentiment_result, comment_text, source.score_map)
+            results.append((source, comment_id, sentiment_result, sentiment_score, second_model_processed, sentiment_source))
+            logger.info(f"Scored comment_id: {comment_id} with sentiment: {sentiment_result}, score: {sentiment_score}")
+        except Exception as e:
+            logger.error(f"Error processing comment_id: {comment_id}: {e}", exc_info=True)
+            results.append((source, comment_id, "Missed Value", 11, False, FAILED_SOURCE))
+
+    return results, stats
+
+
+class SentimentEngine:
+    """
+    Usage:
+        engine = SentimentEngine(logger, [dima_source(), app_source(app_ids)])
+        engine.run()                      # one process, fetch -> infer -> write pipeline
+        engine.run_sharded(num_workers=4) # forked workers, one id shard each
+
+    Every page holds up to page_size rows, split evenly over the sources that still
+    have pending rows; each source keeps its own keyset cursor and writer.
+    """
+
+    def __init__(self, logger, sources, page_size=100, batch_size=None):
+        self.logger = logger
+        self.sources = list(sources)
+        self.page_size = page_size
+        self.batch_size = batch_size
+
+    def score(self, items):
+        return score_comments(self.logger, items, batch_size=self.batch_size)
+
+    def run(self, queue_size=2, shard=None, on_progress=None):
+        version = sentiment_fingerprint()
+        writers = {source.name: source.writer(self.logger, version) for source in self.sources}
+        cursors = {source.name: None for source in self.sources}
+        exhausted = set()
+        totals = new_cascade_stats()
+
+        def fetch_page(_after_id):
+            # per-source keyset cursors instead of the pipeline's single id cursor
+            active = [source for source in self.sources if source.name not in exhausted]
+            if not active:
+                return []
+            per_source = max(1, self.page_size // len(active))
+            items = []
+            for source in active:
+                rows = source.fetch_pending(self.logger, limit=per_source, after_id=cursors[source.name], shard=shard)
+                if len(rows) < per_source:
+                    exhausted.add(source.name)
+                if rows:
+                    cursors[source.name] = rows[-1][0]
+                items.extend((source,) + tuple(row) for row in rows)
+            return items
+
+        def score_page(items):
+            results, stats = self.score(items)
+            for key, value in stats.items():
+                totals[key] += value
+            return results
+
+        def write_results(results):
+            for source, *result in results:
+                writers[source.name].add(*result)
+            for writer in writers.values():
+                writer.flush()
+
+        try:
+            return run_sentiment_pipeline(
+                self.logger,
+                fetch_page=fetch_page,
+                score_page=score_page,
+                write_results=write_results,
+                queue_size=queue_size,
+                on_progress=on_progress
+            )
+        finally:
+            for writer in writers.values():
+                writer.close()
+            log_cache_stats(self.logger)
+            log_cascade_stats(self.logger, totals)
+
+    def run_sharded(self, num_workers=None, threads_per_worker=None, queue_size=2):
+        def worker(shard_index, num_shards, report):
+            result = self.run(queue_size=queue_size, shard=(shard_index, num_shards), on_progress=report)
+            return result["processed_comments"]
+
+        return run_sharded(self.logger, worker, num_workers=num_workers, threads_per_worker=threads_per_worker)
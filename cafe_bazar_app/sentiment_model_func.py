@@ -1,13 +1,50 @@
 
 # Import libraries
-from transformers import MT5ForConditionalGeneration, MT5Tokenizer, pipeline
+from transformers import MT5ForConditionalGeneration, MT5Tokenizer, MT5TokenizerFast, pipeline
+from transformers.modeling_outputs import BaseModelOutput
+import torch
 # from googletrans import Translator
-from deep_translator import GoogleTranslator
 import os
 import time 
+import threading
+import hashlib
+from .sentiment_cache import get_sentiment_cache
+from .translation_func import get_translator, translate_texts, translation_version
+from .phrase_rules import get_phrase_rules
+from .batch_scheduler import run_in_token_batches, token_lengths
+from .mt5_encoding import MT5InputEncoder
+from .distilled_sentiment import run_distilled_tier, get_distilled_model, DISTILLED_THRESHOLD
 
+MT5_MODEL_NAME = "persiannlp/mt5-base-parsinlu-sentiment-analysis"
+SECOND_MODEL_PATH = "/home/mahdi/.cache/huggingface/hub/models--distilbert-base-uncased-finetuned-sst-2-english/snapshots/714eb0fa89d2f80546fda750413ed43d93601a13"
 
-def load_models():
+# CPU inference backend: "fp32" (default), "int8" (torch dynamic quantization)
+# or "onnx" (ONNX Runtime through optimum, exported once into ONNX_EXPORT_DIR)
+INFERENCE_BACKEND = os.getenv("SENTIMENT_BACKEND", "fp32")
+ONNX_EXPORT_DIR = os.getenv("SENTIMENT_ONNX_DIR", "cache/onnx")
+# Rust-backed MT5TokenizerFast when it can be built from the local files; 0 forces the Python tokenizer
+USE_FAST_TOKENIZER = os.getenv("SENTIMENT_FAST_TOKENIZER", "1") != "0"
+
+
+def quantize_model(model):
+    """Dynamic int8 quantization of every Linear layer (weights int8, activations quantized on the fly)."""
+    return torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+
+
+def load_onnx_model(model_class, source, export_name):
+    """Load an exported ONNX Runtime model, exporting it from the PyTorch checkpoint the first time."""
+    export_dir = os.path.join(ONNX_EXPORT_DIR, export_name)
+    if os.path.isdir(export_dir):
+        return model_class.from_pretrained(export_dir)
+    model = model_class.from_pretrained(source, export=True, local_files_only=True)
+    model.save_pretrained(export_dir)
+    return model
+
+
+def load_models(backend=None):
+    backend = backend or INFERENCE_BACKEND
+    if backend not in ("fp32", "int8", "onnx"):
+        raise ValueError(f"Unknown sentiment inference backend: {backend}")
     ## For using local models
     os.environ["TRANSFORMERS_OFFLINE"] = "1"
     os.environ["HF_DATASETS_OFFLINE"] = "1"
@@ -15,20 +52,33 @@ def load_models():
 
     
     # Load the tokenizer and model
-    model_name = "persiannlp/mt5-base-parsinlu-sentiment-analysis"
+    model_name = MT5_MODEL_NAME
     # tokenizer = MT5Tokenizer.from_pretrained(model_name)
     # model = MT5ForConditionalGeneration.from_pretrained(model_name)
 
     # For localize the first model
-    tokenizer = MT5Tokenizer.from_pretrained(
-        model_name,
-        local_files_only=True
-    )
+    tokenizer = None
+    if USE_FAST_TOKENIZER:
+        try:
+            tokenizer = MT5TokenizerFast.from_pretrained(model_name, local_files_only=True)
+        except Exception:
+            # no tokenizer.json in the local snapshot and no converter available
+            tokenizer = None
+    if tokenizer is None:
+        tokenizer = MT5Tokenizer.from_pretrained(
+            model_name,
+            local_files_only=True
+        )
 
-    model = MT5ForConditionalGeneration.from_pretrained(
-        model_name,
-        local_files_only=True
-    )
+    if backend == "onnx":
+        # optional dependency: pip install optimum[onnxruntime]
+        from optimum.onnxruntime import ORTModelForSeq2SeqLM, ORTModelForSequenceClassification
+        model = load_onnx_model(ORTModelForSeq2SeqLM, model_name, "mt5")
+    else:
+        model = MT5ForConditionalGeneration.from_pretrained(
+            model_name,
+            local_files_only=True
+        )
 
     # Load the second model (Hugging Face pipeline)
     # classifier = pipeline("sentiment-analysis", device=-1)
@@ -36,29 +86,92 @@ def load_models():
     ## For localize the second model
     classifier = pipeline(
         "sentiment-analysis",
-        model="/home/mahdi/.cache/huggingface/hub/models--distilbert-base-uncased-finetuned-sst-2-english/snapshots/714eb0fa89d2f80546fda750413ed43d93601a13",
-        tokenizer="/home/mahdi/.cache/huggingface/hub/models--distilbert-base-uncased-finetuned-sst-2-english/snapshots/714eb0fa89d2f80546fda750413ed43d93601a13",
+        model=load_onnx_model(ORTModelForSequenceClassification, SECOND_MODEL_PATH, "distilbert") if backend == "onnx" else SECOND_MODEL_PATH,
+        tokenizer=SECOND_MODEL_PATH,
         device=-1
     )
 
+    if backend == "int8":
+        model = quantize_model(model)
+        classifier.model = quantize_model(classifier.model)
+
 
-    # Initialize Google Translator
+    # Initialize the translator (Google by default, see translation_func.py)
     # translator = Translator()
-    translator = GoogleTranslator(source="auto", target="en")
+    translator = get_translator()
     # Sentiment mapping for scoring
     
 
 
     return tokenizer, model, classifier, translator
 
-tokenizer, model, classifier, translator = load_models()
+# Models are loaded on first use (or by a warm-up thread), not at import time
+_models = None
+_models_lock = threading.Lock()
+_models_error = None
+
+
+def get_models():
+    """Return (tokenizer, model, classifier, translator), loading them on the first call."""
+    global _models, _models_error
+    if _models is None:
+        with _models_lock:
+            if _models is None:
+                try:
+                    _models = load_models()
+                    _models_error = None
+                except Exception as e:
+                    _models_error = str(e)
+                    raise
+    return _models
+
+
+def models_ready():
+    return _models is not None
 
 
-def run_first_model(logger,context, text_b="نظر شما چیست", **generator_args):
+def models_status():
+    if _models is not None:
+        return {"ready": True, "error": None, "fast_tokenizer": bool(getattr(_models[0], "is_fast", False))}
+    return {"ready": False, "loading": _models_lock.locked(), "error": _models_error}
+
+
+def start_model_warmup(logger):
+    """Load the models in a background daemon thread so callers are not blocked."""
+    def warmup():
+        try:
+            start = time.time()
+            logger.info("Warming up sentiment models...")
+            get_models()
+            logger.info(f"Sentiment models ready after {time.time() - start:.1f}s")
+        except Exception as e:
+            logger.error(f"Sentiment model warm-up failed: {e}", exc_info=True)
+
+    thread = threading.Thread(target=warmup, name="sentiment-model-warmup", daemon=True)
+    thread.start()
+    return thread
+
+
+_encoders = {}
+_encoders_lock = threading.Lock()
+
+
+def get_input_encoder(tokenizer, text_b="نظر شما چیست"):
+    """Shared MT5InputEncoder per (tokenizer, question): suffix encoded once, comment encodings cached."""
+    key = (id(tokenizer), text_b)
+    if key not in _encoders:
+        with _encoders_lock:
+            if key not in _encoders:
+                _encoders[key] = MT5InputEncoder(tokenizer, text_b)
+    return _encoders[key]
+
+
+def run_first_model(logger,context, text_b="نظر شما چیست", fallback="no sentiment expressed", **generator_args):
     try:
 
         logger.debug(f"Running MT5 model for text: {context}")
-        input_ids = tokenizer.encode(context + "<sep>" + text_b, return_tensors="pt")
+        tokenizer, model, _, _ = get_models()
+        input_ids = get_input_encoder(tokenizer, text_b).encode([context])["input_ids"]
         res = model.generate(input_ids, **generator_args)
         output = tokenizer.batch_decode(res, skip_special_tokens=True)
 
@@ -68,55 +181,410 @@ def run_first_model(logger,context, text_b="نظر شما چیست", **generator
         return output[0]
     except Exception as e:
         logger.error(f"Error in run_model: {e}", exc_info=False)
-        return "no sentiment expressed"
+        return fallback
+
+
+def generate_labels(tokenizer, model, contexts, text_b="نظر شما چیست", **generator_args):
+    """One padded generate call for a list of comments with the given tokenizer/model pair."""
+    inputs = get_input_encoder(tokenizer, text_b).encode(contexts)
+    res = model.generate(
+        input_ids=inputs["input_ids"],
+        attention_mask=inputs["attention_mask"],
+        **generator_args
+    )
+    output = tokenizer.batch_decode(res, skip_special_tokens=True)
+    if len(output) != len(contexts):
+        raise ValueError(f"Model returned {len(output)} outputs for {len(contexts)} comments.")
+    return output
+
+
+def check_backend_parity(logger, texts, backend="int8", english_texts=None, batch_size=None):
+    """
+    Compare a backend against the fp32 models on a sample.
+    MT5 labels are compared on texts (Persian comments); the DistilBERT labels on
+    english_texts when given. Returns agreement rates and the disagreeing samples.
+    """
+    batch_size = batch_size or FIRST_MODEL_BATCH_SIZE
+    reference = load_models("fp32")
+    candidate = load_models(backend)
+    report = {"backend": backend, "samples": len(texts)}
+
+    timings = {}
+    labels = {}
+    for name, (tokenizer, model, _, _) in (("fp32", reference), (backend, candidate)):
+        start = time.time()
+        labels[name] = []
+        for i in range(0, len(texts), batch_size):
+            labels[name].extend(generate_labels(tokenizer, model, texts[i:i + batch_size]))
+        timings[name] = round(time.time() - start, 2)
+
+    mismatches = [
+        {"text": text, "fp32": ref, backend: cand}
+        for text, ref, cand in zip(texts, labels["fp32"], labels[backend]) if ref != cand
+    ]
+    report["first_model_agreement"] = round(1 - len(mismatches) / len(texts), 4) if texts else 1.0
+    report["first_model_mismatches"] = mismatches
+    report["first_model_seconds"] = timings
+
+    if english_texts:
+        ref_labels = [r["label"] for r in reference[2](english_texts)]
+        cand_labels = [r["label"] for r in candidate[2](english_texts)]
+        agree = sum(ref == cand for ref, cand in zip(ref_labels, cand_labels))
+        report["second_model_agreement"] = round(agree / len(english_texts), 4)
+
+    logger.info(
+        f"Backend parity {backend} vs fp32: MT5 agreement {report['first_model_agreement']:.2%} "
+        f"on {len(texts)} comments, time {timings}"
+    )
+    return report
+
+
+# Default number of comments encoded and decoded together in one generate call
+FIRST_MODEL_BATCH_SIZE = int(os.getenv("SENTIMENT_BATCH_SIZE", "16"))
+
+# "generate" = free-text decoding, "score" = rank the known labels directly
+FIRST_MODEL_MODE = os.getenv("SENTIMENT_FIRST_MODEL_MODE", "generate")
+
+# The only labels persiannlp/mt5-base-parsinlu-sentiment-analysis is trained to produce
+SENTIMENT_LABELS = [
+    "very negative",
+    "negative",
+    "neutral",
+    "mixed",
+    "positive",
+    "very positive",
+    "no sentiment expressed",
+]
+
+# MT5 labels that are unclear enough to send the comment to the fallback model
+SECOND_MODEL_TRIGGER_LABELS = ["no sentiment expressed", "mixed", "neutral"]
+
+# The fallback result only replaces the MT5 label for these ratings:
+# rating -> (second model label, final sentiment label)
+SECOND_MODEL_OVERRIDES = {
+    1: ("NEGATIVE", "negative"),
+    5: ("POSITIVE", "positive"),
+}
+
+FIRST_MODEL_STAGE = "first_model"
+SECOND_MODEL_STAGE = "second_model"
+
+# Tier that produced a stored label (sentiment_source column). Only FIRST_MODEL_SOURCE
+# rows are MT5 labels, so only those are used to train the distilled model.
+EMPTY_SOURCE = "empty"
+PHRASE_RULE_SOURCE = "phrase_rule"
+DISTILLED_SOURCE = "distilled"
+FIRST_MODEL_SOURCE = "mt5"
+SECOND_MODEL_SOURCE = "second_model"
+FAILED_SOURCE = "failed"
+
+
+def plan_sentiment_stages(comment_text, comment_rating):
+    """
+    Decide, before any model runs, which stages can still change the final label.
+    A comment matching a phrase rule needs no model at all. The fallback model can
+    only matter for ratings in SECOND_MODEL_OVERRIDES, so for every other rating it
+    is never planned (no translation, no classifier).
+    """
+    if get_phrase_rules().match(comment_text):
+        return []
+    stages = [FIRST_MODEL_STAGE]
+    if comment_rating in SECOND_MODEL_OVERRIDES:
+        stages.append(SECOND_MODEL_STAGE)
+    return stages
+
+
+def apply_second_model(sentiment_result, second_model_result, comment_rating):
+    """Return (sentiment_result, second_model_processed) after the fallback override rule."""
+    override = SECOND_MODEL_OVERRIDES.get(comment_rating)
+    if override and second_model_result == override[0]:
+        return override[1], True
+    return sentiment_result, False
+
+
+def new_cascade_stats():
+    return {
+        "comments": 0,
+        "phrase_rule_matched": 0,
+        "distilled_model_used": 0,
+        "first_model_run": 0,
+        "second_model_run": 0,
+        "second_model_skipped_by_plan": 0,
+        "second_model_not_triggered": 0,
+    }
+
+
+def log_cascade_stats(logger, stats):
+    logger.info(
+        f"Cascade: {stats['comments']} comments, phrase rules {stats['phrase_rule_matched']}, "
+        f"distilled model {stats['distilled_model_used']}, MT5 run {stats['first_model_run']}, "
+        f"fallback run {stats['second_model_run']}, fallback skipped by plan {stats['second_model_skipped_by_plan']}, "
+        f"fallback not triggered {stats['second_model_not_triggered']}"
+    )
+
+_label_targets = None
+
+
+def get_label_targets():
+    """Tokenize the label sequences once and keep them for every later call."""
+    global _label_targets
+    if _label_targets is None:
+        tokenizer = get_models()[0]
+        encoded = tokenizer(SENTIMENT_LABELS, return_tensors="pt", padding=True)
+        _label_targets = (encoded["input_ids"], encoded["attention_mask"])
+    return _label_targets
+
+
+def question_tokens(tokenizer, text_b):
+    # "<sep>" + question appended to every comment, plus the end-of-sequence token
+    return token_lengths(tokenizer, ["<sep>" + text_b])[0] + 1
+
+
+def run_first_model_scores(logger, contexts, text_b="نظر شما چیست", batch_size=None):
+    """
+    Constrained mode for the MT5 model: instead of open-ended generate, score the
+    seven label sequences for every comment. The encoder runs once per comment and
+    its output is reused for all labels; the decoder runs one teacher-forced pass.
+    Returns a list of (best_label, {label: probability}) in input order.
+    """
+    batch_size = batch_size or FIRST_MODEL_BATCH_SIZE
+    tokenizer, model, _, _ = get_models()
+    encoder = get_input_encoder(tokenizer, text_b)
+    label_ids, label_mask = get_label_targets()
+    num_labels = len(SENTIMENT_LABELS)
+    decoder_input_ids = model._shift_right(label_ids)
+
+    def score_chunk(chunk):
+        logger.debug(f"Scoring MT5 labels for a batch of {len(chunk)} comments")
+        inputs = encoder.encode(chunk)
+        with torch.no_grad():
+            encoder_hidden = model.get_encoder()(
+                input_ids=inputs["input_ids"],
+                attention_mask=inputs["attention_mask"]
+            ).last_hidden_state
+
+            # One row per (comment, label) pair, sharing the comment's encoder output
+            logits = model(
+                encoder_outputs=BaseModelOutput(
+                    last_hidden_state=encoder_hidden.repeat_interleave(num_labels, dim=0)
+                ),
+                attention_mask=inputs["attention_mask"].repeat_interleave(num_labels, dim=0),
+                decoder_input_ids=decoder_input_ids.repeat(len(chunk), 1)
+            ).logits
+
+            targets = label_ids.repeat(len(chunk), 1)
+            token_log_probs = logits.log_softmax(dim=-1).gather(-1, targets.unsqueeze(-1)).squeeze(-1)
+            sequence_log_probs = (token_log_probs * label_mask.repeat(len(chunk), 1)).sum(dim=-1)
+            probabilities = sequence_log_probs.view(len(chunk), num_labels).softmax(dim=-1)
+
+        results = []
+        for row in probabilities.tolist():
+            label_probs = dict(zip(SENTIMENT_LABELS, row))
+            best_label = max(label_probs, key=label_probs.get)
+            logger.info(f"MT5 label scores: {best_label} ({label_probs[best_label]:.3f})")
+            results.append((best_label, label_probs))
+        return results
+
+    return run_in_token_batches(
+        logger, encoder, contexts, score_chunk,
+        max_batch_size=batch_size, extra_tokens=question_tokens(tokenizer, text_b)
+    )
+
+
+def run_first_model_batch(logger, contexts, text_b="نظر شما چیست", batch_size=None, fallback="no sentiment expressed", **generator_args):
+    """
+    Batched version of run_first_model.
+    Comments are grouped into length-bucketed batches under SENTIMENT_TOKEN_BUDGET
+    (at most batch_size each) and every batch is decoded with one model.generate
+    call. Returns one label per input, in input order.
+    If a chunk fails, its comments are retried one by one with run_first_model;
+    comments that still fail get fallback.
+    With SENTIMENT_FIRST_MODEL_MODE=score the labels come from run_first_model_scores.
+    """
+    batch_size = batch_size or FIRST_MODEL_BATCH_SIZE
+    if FIRST_MODEL_MODE == "score":
+        try:
+            return [label for label, _ in run_first_model_scores(logger, contexts, text_b, batch_size)]
+        except Exception as e:
+            logger.error(f"Error in run_first_model_scores, falling back to generate: {e}", exc_info=False)
+
+    tokenizer, model, _, _ = get_models()
+
+    def generate_chunk(chunk):
+        try:
+            logger.debug(f"Running MT5 model for a batch of {len(chunk)} comments")
+            output = generate_labels(tokenizer, model, chunk, text_b, **generator_args)
+            logger.info(f"MT5 model batch output: {output}")
+            return output
+        except Exception as e:
+            logger.error(f"Error in run_first_model_batch, falling back to single comments: {e}", exc_info=False)
+            return [run_first_model(logger, context, text_b, fallback, **generator_args) for context in chunk]
+
+    return run_in_token_batches(
+        logger, get_input_encoder(tokenizer, text_b), contexts, generate_chunk,
+        max_batch_size=batch_size, extra_tokens=question_tokens(tokenizer, text_b)
+    )
 
 def run_second_model(logger, comment_text):
+    return run_second_model_batch(logger, [comment_text])[0]
+
+
+def classify_batch(classifier, texts):
+    # Without batch_size the pipeline runs one forward pass per text
+    return classifier(texts, batch_size=len(texts), truncation=True)
+
+
+def run_second_model_batch(logger, comment_texts):
+    """
+    Translate a list of comments (cached, batched translate_batch calls) and classify
+    all translations with one classifier call. Returns one label per comment;
+    comments whose translation or classification fails get "no sentiment expressed".
+    """
+    labels = ["no sentiment expressed"] * len(comment_texts)
     try:
-        logger.debug(f"Running second model for text: {comment_text}")
+        logger.debug(f"Running second model for {len(comment_texts)} comments")
+        classifier = get_models()[2]
         # translated_text = translator.translate(comment_text, dest="en").text
-        translated_text = translator.translate(comment_text)
-        if not translated_text:
-            raise ValueError("Translation returned empty text.")
-        
-        result = classifier(translated_text)
-        if not result or not isinstance(result, list):
+        translated_texts = translate_texts(logger, comment_texts)
+        to_classify = [i for i, translated_text in enumerate(translated_texts) if translated_text]
+        if len(to_classify) < len(comment_texts):
+            logger.error(f"Translation returned empty text for {len(comment_texts) - len(to_classify)} comments.")
+        if not to_classify:
+            return labels
+
+        result = run_in_token_batches(
+            logger, classifier.tokenizer, [translated_texts[i] for i in to_classify],
+            lambda batch: classify_batch(classifier, batch)
+        )
+        if not result or not isinstance(result, list) or len(result) != len(to_classify):
             raise ValueError("Classifier returned invalid result.")
-        
-        logger.info(f"Second model output: {result[0]['label']}")
-        return result[0]["label"]
+
+        for i, prediction in zip(to_classify, result):
+            labels[i] = prediction["label"]
+        logger.info(f"Second model output: {[prediction['label'] for prediction in result]}")
+        return labels
     except Exception as e:
         logger.error(f"Error in run_second_model: {e}", exc_info=False)
-        return "no sentiment expressed"
+        return labels
+
+def first_model_version():
+    # Cache keys change whenever the model or the decoding mode changes
+    return f"{MT5_MODEL_NAME}:{FIRST_MODEL_MODE}:{INFERENCE_BACKEND}"
+
+
+def second_model_version():
+    return f"{translation_version()}:{os.path.basename(SECOND_MODEL_PATH)}:{INFERENCE_BACKEND}"
+
+
+def sentiment_fingerprint():
+    """
+    Short hash of everything that decides a stored label: both model versions, the
+    phrase rules, the distilled model and the fallback override rule. Stored per row
+    so only rows scored under another fingerprint need re-scoring after an upgrade.
+    """
+    distilled = get_distilled_model()
+    parts = [
+        first_model_version(),
+        second_model_version(),
+        get_phrase_rules().version,
+        f"{distilled['version']}:{DISTILLED_THRESHOLD}" if distilled else "no-distilled",
+        repr(sorted(SECOND_MODEL_OVERRIDES.items())),
+    ]
+    return hashlib.sha256("|".join(parts).encode("utf-8")).hexdigest()[:12]
+
+
+def run_first_model_cached(logger, contexts, batch_size=None, fallback="no sentiment expressed"):
+    """
+    run_first_model_batch behind the sentiment cache. Only texts missing from the
+    cache go to the model, and repeated texts inside one call are scored once.
+    Comments the model failed on get fallback.
+    """
+    cache = get_sentiment_cache()
+    if cache is None:
+        return run_first_model_batch(logger, contexts, batch_size=batch_size, fallback=fallback)
+
+    version = first_model_version()
+    results = {}
+    for context in contexts:
+        if context not in results:
+            results[context] = cache.get(version, context) if isinstance(context, str) else None
+
+    missing = [context for context, label in results.items() if label is None]
+    if missing:
+        # failed comments come back as None: they get the error fallback but are never cached
+        labels = run_first_model_batch(logger, missing, batch_size=batch_size, fallback=None)
+        results.update(zip(missing, labels))
+        cache.put_many(version, [
+            (context, label) for context, label in zip(missing, labels)
+            if isinstance(context, str) and label is not None
+        ])
+    logger.info(f"MT5 cache: {len(contexts) - len(missing)} of {len(contexts)} comments served without the model")
+    return [fallback if results[context] is None else results[context] for context in contexts]
+
+
+def run_first_tier(logger, contexts, batch_size=None):
+    """
+    First tier of the cascade: the distilled classifier answers the comments it is
+    confident about and only the rest go to MT5 (cached).
+    Returns (labels, label sources) in input order; a source is DISTILLED_SOURCE,
+    FIRST_MODEL_SOURCE or FAILED_SOURCE (MT5 error, labelled "no sentiment expressed").
+    """
+    labels = run_distilled_tier(logger, contexts)
+    sources = [DISTILLED_SOURCE if label is not None else FIRST_MODEL_SOURCE for label in labels]
+    remaining = [i for i, label in enumerate(labels) if label is None]
+    if remaining:
+        mt5_labels = run_first_model_cached(logger, [contexts[i] for i in remaining], batch_size=batch_size, fallback=None)
+        for i, label in zip(remaining, mt5_labels):
+            if label is None:
+                label, sources[i] = "no sentiment expressed", FAILED_SOURCE
+            labels[i] = label
+    return labels, sources
+
+
+def run_second_model_cached(logger, comment_text):
+    return run_second_model_batch_cached(logger, [comment_text])[0]
+
+
+def run_second_model_batch_cached(logger, comment_texts):
+    """run_second_model_batch behind the sentiment cache, same contract as run_first_model_cached."""
+    cache = get_sentiment_cache()
+    if cache is None:
+        return run_second_model_batch(logger, comment_texts)
+
+    version = second_model_version()
+    results = {}
+    for text in comment_texts:
+        if text not in results:
+            results[text] = cache.get(version, text) if isinstance(text, str) else None
+
+    missing = [text for text, label in results.items() if label is None]
+    if missing:
+        labels = run_second_model_batch(logger, missing)
+        results.update(zip(missing, labels))
+        # "no sentiment expressed" is the error fallback (e.g. translation failure), never cache it
+        cache.put_many(version, [
+            (text, label) for text, label in zip(missing, labels)
+            if isinstance(text, str) and label in ("POSITIVE", "NEGATIVE")
+        ])
+    return [results[text] for text in comment_texts]
+
+
+def log_cache_stats(logger):
+    cache = get_sentiment_cache()
+    if cache is not None:
+        cache.log_stats(logger)
+    for encoder in list(_encoders.values()):
+        logger.info(f"MT5 encoding cache: {encoder.stats()}")
+
 
 # Validate sentiment result and assign score
 def validate_and_score_sentiment(logger, sentiment_result,comments, SENTIMENT_SCORES):
-    neutral_phrases = [
-    "بد نیست",
-        "بد‌نیست",
-        "بد نبود",
-        "بدک نیست",
-        "بدی نیست",
-    "نظری ندارم",
-    "نظر خاصی ندارم",
-    "ندارم",
-    "نظری ندارم",
-   "نه خوب نه بعد",
-    "معمولی",
-    "بابت تاخیر عذر خواهی"
-]
-    positive_phrases = ['حرف نداره',
-                         'عالیه', 'خیلی خوبه' , 'واقعا خوبه' , 'دمتون گرم' , 'دستتون درد نکنه' , 'خسته نباشید' , 'سپاس فراوان' , 'کار راه بنداز' , 'از این بهتر نیست','خیلی خفنه','عالی لامصب','خیلی عال','بسیارعلی','عالی،بود',
-                         'خیلی الی','خیلی خوی','بسیار الی', 'خیلی خفنی', 'بسیار هالی','بانک ملت تکه','بسیارعلی'
-                         ]
-    if comments  in neutral_phrases:
-
-        sentiment_result = "no sentiment expressed"
-        sentiment_score = SENTIMENT_SCORES[sentiment_result]
-        logger.debug(f"Validated sentiment in netrual phrases: {sentiment_result}, Score: {sentiment_score}")
-    elif comments in positive_phrases:
-        sentiment_result = "very positive"
+    # Phrase rules (cafe_bazar_app/sentiment_phrase_rules.json) override the model label
+    rule_result = get_phrase_rules().match(comments)
+    if rule_result is not None:
+        sentiment_result = rule_result
         sentiment_score = SENTIMENT_SCORES[sentiment_result]
-        logger.debug(f"Validated sentiment in positive phrases: {sentiment_result}, Score: {sentiment_score}")
+        logger.debug(f"Validated sentiment in phrase rules: {sentiment_result}, Score: {sentiment_score}")
 
     else:    
         sentiment_result = sentiment_result.lower()
@@ -0,0 +1,142 @@
+# Pipelined sentiment worker: fetch -> infer -> write
+# The reader prefetches the next page and the writer commits the previous one in
+# their own threads, so the CPU-bound model in the calling thread never waits on
+# Postgres round trips. Queues are bounded so the reader cannot run far ahead.
+import queue
+import threading
+import time
+
+_STOP = object()
+
+
+class StageStats:
+    def __init__(self, name):
+        self.name = name
+        self.pages = 0
+        self.rows = 0
+        self.busy_seconds = 0.0
+
+    def record(self, rows, seconds):
+        self.pages += 1
+        self.rows += rows
+        self.busy_seconds += seconds
+
+    def rate(self):
+        return self.rows / self.busy_seconds if self.busy_seconds else 0.0
+
+    def as_dict(self):
+        return {
+            "pages": self.pages,
+            "rows": self.rows,
+            "busy_seconds": round(self.busy_seconds, 3),
+            "rows_per_second": round(self.rate(), 2),
+        }
+
+
+def _put(q, item, stop):
+    # Blocking put that gives up when another stage has failed
+    while True:
+        try:
+            q.put(item, timeout=0.5)
+            return True
+        except queue.Full:
+            if stop.is_set():
+                return False
+
+
+def _get(q, stop):
+    while True:
+        try:
+            return q.get(timeout=0.5)
+        except queue.Empty:
+            if stop.is_set():
+                return _STOP
+
+
+def run_sentiment_pipeline(logger, fetch_page, score_page, write_results, queue_size=2, on_progress=None):
+    """
+    fetch_page(after_id) -> list of rows whose first column is the id (keyset paging);
+        an empty list ends the run.
+    score_page(rows) -> list of results to write.
+    write_results(results) -> writes and commits one page of results.
+    on_progress(rows) is called from the writer thread after every committed page.
+    Returns per-stage statistics and the number of processed rows.
+    """
+    fetched = queue.Queue(maxsize=queue_size)
+    scored = queue.Queue(maxsize=queue_size)
+    stop = threading.Event()
+    errors = []
+    stats = {name: StageStats(name) for name in ("reader", "inference", "writer")}
+
+    def reader():
+        after_id = None
+        try:
+            while not stop.is_set():
+                start = time.time()
+                rows = fetch_page(after_id)
+                stats["reader"].record(len(rows), time.time() - start)
+                if not rows:
+                    break
+                after_id = rows[-1][0]
+                if not _put(fetched, rows, stop):
+                    break
+        except Exception as e:
+            logger.error(f"Pipeline reader failed: {e}", exc_info=True)
+            errors.append(e)
+            stop.set()
+        finally:
+            _put(fetched, _STOP, stop)
+
+    def writer():
+        try:
+            while True:
+                results = _get(scored, stop)
+                if results is _STOP:
+                    break
+                start = time.time()
+                write_results(results)
+                stats["writer"].record(len(results), time.time() - start)
+                if on_progress is not None:
+                    on_progress(len(results))
+        except Exception as e:
+            logger.error(f"Pipeline writer failed: {e}", exc_info=True)
+            errors.append(e)
+            stop.set()
+
+    reader_thread = threading.Thread(target=reader, name="sentiment-reader", daemon=True)
+    writer_thread = threading.Thread(target=writer, name="sentiment-writer", daemon=True)
+    reader_thread.start()
+    writer_thread.start()
+
+    try:
+        while True:
+            rows = _get(fetched, stop)
+            if rows is _STOP:
+                break
+            start = time.time()
+            results = score_page(rows)
+            stats["inference"].record(len(rows), time.time() - start)
+            if not _put(scored, results, stop):
+                break
+            logger.info(
+                f"Pipeline: fetch queue {fetched.qsize()}/{queue_size}, write queue {scored.qsize()}/{queue_size}; "
+                + ", ".join(f"{s.name} {s.rate():.1f} rows/s" for s in stats.values())
+            )
+    except Exception as e:
+        logger.error(f"Pipeline inference failed: {e}", exc_info=True)
+        errors.append(e)
+        stop.set()
+    finally:
+        _put(scored, _STOP, stop)
+        reader_thread.join()
+        writer_thread.join()
+
+    bottleneck = max(stats.values(), key=lambda s: s.busy_seconds).name
+    logger.info(f"Pipeline finished, bottleneck stage: {bottleneck}; " + str({name: s.as_dict() for name, s in stats.items()}))
+    if errors:
+        raise errors[0]
+    return {
+        "processed_comments": stats["writer"].rows,
+        "bottleneck": bottleneck,
+        "stages": {name: s.as_dict() for name, s in stats.items()},
+    }
@@ -0,0 +1,95 @@
+# Multi-process sentiment sharding
+# The parent loads the models once and forks N workers, so the weights are shared
+# copy-on-write. Worker k owns the rows with id % N == k and reports progress to
+# the parent through a queue.
+import multiprocessing
+import os
+import queue
+import time
+from .sentiment_model_func import get_models
+from .sentiment_cache import reset_sentiment_cache
+
+SENTIMENT_WORKERS = int(os.getenv("SENTIMENT_WORKERS", "1"))
+
+
+def default_threads_per_worker(num_workers):
+    return max(1, (os.cpu_count() or 1) // num_workers)
+
+
+def _worker_main(worker_fn, shard_index, num_shards, threads, events):
+    import torch
+    torch.set_num_threads(threads)
+    # SQLite connections must not be shared with the parent after fork
+    reset_sentiment_cache()
+
+    def report(rows):
+        events.put(("progress", shard_index, rows))
+
+    try:
+        total = worker_fn(shard_index, num_shards, report)
+        events.put(("done", shard_index, total))
+    except Exception as e:
+        events.put(("error", shard_index, str(e)))
+
+
+def run_sharded(logger, worker_fn, num_workers=None, threads_per_worker=None):
+    """
+    worker_fn(shard_index, num_shards, report) runs inside each forked worker,
+    calls report(rows) after every committed page and returns its processed count.
+    Returns the aggregated progress once every worker has exited.
+    """
+    num_workers = num_workers or SENTIMENT_WORKERS
+    threads_per_worker = threads_per_worker or default_threads_per_worker(num_workers)
+
+    # Load before forking so every worker shares the same weights
+    get_models()
+
+    ctx = multiprocessing.get_context("fork")
+    events = ctx.Queue()
+    workers = [
+        ctx.Process(
+            target=_worker_main,
+            args=(worker_fn, shard_index, num_workers, threads_per_worker, events),
+            name=f"sentiment-shard-{shard_index}"
+        )
+        for shard_index in range(num_workers)
+    ]
+    logger.info(f"Starting {num_workers} sentiment workers with {threads_per_worker} torch threads each")
+    start = time.time()
+    for worker in workers:
+        worker.start()
+
+    progress = {shard_index: 0 for shard_index in range(num_workers)}
+    finished = {}
+    errors = {}
+    while len(finished) + len(errors) < num_workers:
+        try:
+            kind, shard_index, value = events.get(timeout=5)
+        except queue.Empty:
+            # a worker killed without reporting (e.g. OOM) would otherwise block us forever
+            dead = [i for i, w in enumerate(workers) if not w.is_alive() and i not in finished and i not in errors]
+            for shard_index in dead:
+                errors[shard_index] = f"worker exited with code {workers[shard_index].exitcode}"
+            continue
+
+        if kind == "progress":
+            progress[shard_index] += value
+            total = sum(progress.values())
+            logger.info(f"Sharded sentiment: {total} comments done ({total / (time.time() - start):.1f}/s), per shard {progress}")
+        elif kind == "done":
+            finished[shard_index] = value
+            logger.info(f"Sentiment shard {shard_index} finished with {value} comments")
+        else:
+            errors[shard_index] = value
+            logger.error(f"Sentiment shard {shard_index} failed: {value}")
+
+    for worker in workers:
+        worker.join()
+
+    return {
+        "processed_comments": sum(progress.values()),
+        "workers": num_workers,
+        "per_shard": progress,
+        "errors": errors,
+        "seconds": round(time.time() - start, 1),
+    }
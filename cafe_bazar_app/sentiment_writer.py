@@ -0,0 +1,134 @@
+# Buffered bulk write-back of sentiment results
+# Results are collected in memory and flushed with one UPDATE ... FROM (VALUES ...)
+# per flush, on a single reused database connection. When a version fingerprint is
+# given, it is stored in the sentiment_version column of every written row, next to the
+# tier that produced the label in sentiment_source (both columns are created by the
+# schema scripts: import_comments.create_table / db_queries.txt).
+import os
+import time
+from psycopg2.extras import execute_values
+
+SENTIMENT_FLUSH_SIZE = int(os.getenv("SENTIMENT_FLUSH_SIZE", "200"))
+SENTIMENT_FLUSH_INTERVAL = float(os.getenv("SENTIMENT_FLUSH_INTERVAL", "5"))
+
+
+class SentimentWriter:
+    """
+    Usage:
+        with SentimentWriter(logger, connect_db, "dima_comments", "id") as writer:
+            writer.add(comment_id, sentiment_result, sentiment_score, second_model_processed, sentiment_source)
+
+    A flush happens when flush_size results are buffered, when flush_interval
+    seconds have passed since the last flush, and when the writer is closed.
+    version (e.g. sentiment_fingerprint()) is written to sentiment_version and the
+    sentiment_source of every result to sentiment_source.
+    """
+
+    def __init__(self, logger, connect, table, id_column, flush_size=None, flush_interval=None, version=None):
+        self.logger = logger
+        self.connect = connect
+        self.table = table
+        self.id_column = id_column
+        self.version = version
+        self.flush_size = flush_size or SENTIMENT_FLUSH_SIZE
+        self.flush_interval = flush_interval if flush_interval is not None else SENTIMENT_FLUSH_INTERVAL
+        self.buffer = []
+        self.written = 0
+        self.flushes = 0
+        self._conn = None
+        self._last_flush = time.time()
+
+    def _connection(self):
+        if self._conn is None or self._conn.closed:
+            self._conn = self.connect()
+        return self._conn
+
+    def _update_sql(self):
+        if self.version is None:
+            return f"""
+                UPDATE {self.table} AS t
+                SET sentiment_result = v.sentiment_result,
+                    sentiment_score = v.sentiment_score,
+                    second_model_processed = v.second_model_processed
+                FROM (VALUES %s) AS v(id, sentiment_result, sentiment_score, second_model_processed)
+                WHERE t.{self.id_column} = v.id;
+            """
+        return f"""
+            UPDATE {self.table} AS t
+            SET sentiment_result = v.sentiment_result,
+                sentiment_score = v.sentiment_score,
+                second_model_processed = v.second_model_processed,
+                sentiment_source = v.sentiment_source,
+                sentiment_version = v.sentiment_version
+            FROM (VALUES %s) AS v(id, sentiment_result, sentiment_score, second_model_processed, sentiment_source, sentiment_version)
+            WHERE t.{self.id_column} = v.id;
+        """
+
+    def add(self, comment_id, sentiment_result, sentiment_score, second_model_processed, sentiment_source=None):
+        self.buffer.append((comment_id, sentiment_result, sentiment_score, bool(second_model_processed), sentiment_source))
+        if len(self.buffer) >= self.flush_size or time.time() - self._last_flush >= self.flush_interval:
+            self.flush()
+
+    def flush(self):
+        self._last_flush = time.time()
+        if not self.buffer:
+            return
+        conn = self._connection()
+        rows, self.buffer = self.buffer, []
+        try:
+            with conn.cursor() as cursor:
+                if self.version is None:
+                    execute_values(
+                        cursor, self._update_sql(), [row[:4] for row in rows],
+                        template="(%s, %s::text, %s::integer, %s::boolean)",
+                        page_size=len(rows)
+                    )
+                else:
+                    execute_values(
+                        cursor, self._update_sql(), [row + (self.version,) for row in rows],
+                        template="(%s, %s::text, %s::integer, %s::boolean, %s::text, %s::text)",
+                        page_size=len(rows)
+                    )
+            conn.commit()
+            self.written += len(rows)
+            self.flushes += 1
+            self.logger.info(f"Flushed {len(rows)} sentiment results to {self.table}")
+        except Exception as e:
+            conn.rollback()
+            self.logger.error(f"Bulk update of {self.table} failed, retrying row by row: {e}", exc_info=True)
+            self._flush_row_by_row(conn, rows)
+
+    def _flush_row_by_row(self, conn, rows):
+        query = f"""
+            UPDATE {self.table}
+            SET sentiment_result = %s, sentiment_score = %s, second_model_processed = %s
+            {", sentiment_source = %s, sentiment_version = %s" if self.version is not None else ""}
+            WHERE {self.id_column} = %s;
+        """
+        for comment_id, sentiment_result, sentiment_score, second_model_processed, sentiment_source in rows:
+            params = (sentiment_result, sentiment_score, second_model_processed)
+            if self.version is not None:
+                params += (sentiment_source, self.version)
+            try:
+                with conn.cursor() as cursor:
+                    cursor.execute(query, params + (comment_id,))
+                conn.commit()
+                self.written += 1
+            except Exception as e:
+                conn.rollback()
+                self.logger.error(f"Error updating sentiment from {self.table} for comment_id: {comment_id}: {e}", exc_info=True)
+
+    def close(self):
+        try:
+            self.flush()
+        finally:
+            if self._conn is not None and not self._conn.closed:
+                self._conn.close()
+            self._conn = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+        return False
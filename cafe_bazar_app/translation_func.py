@@ -0,0 +1,132 @@
+# Translation layer for the fallback sentiment model
+# - persistent cache (source-text hash -> English text), shared with the sentiment cache file
+# - batched translate_batch calls instead of one round trip per comment
+# - pluggable translator, with a local stand-in for offline runs and benchmarks
+import os
+import re
+import threading
+from .sentiment_cache import get_sentiment_cache
+
+TRANSLATION_BATCH_SIZE = int(os.getenv("TRANSLATION_BATCH_SIZE", "20"))
+
+
+class LocalStandInTranslator:
+    """
+    Offline stand-in with the same translate/translate_batch interface as
+    deep_translator.GoogleTranslator. Word-by-word lookup over a small sentiment
+    lexicon; unknown words are kept as they are. Only meant for exercising and
+    benchmarking the fallback path without network access.
+    """
+    name = "local"
+
+    LEXICON = {
+        "عالی": "excellent",
+        "عالیه": "excellent",
+        "خوب": "good",
+        "خوبه": "good",
+        "بد": "bad",
+        "افتضاح": "terrible",
+        "ضعیف": "weak",
+        "کند": "slow",
+        "خراب": "broken",
+        "ممنون": "thanks",
+        "ممنونم": "thanks",
+        "مرسی": "thanks",
+        "راضی": "satisfied",
+        "ناراضی": "unsatisfied",
+        "مشکل": "problem",
+        "خطا": "error",
+        "نمیشه": "does not work",
+        "نمی‌شه": "does not work",
+        "نیست": "is not",
+        "خیلی": "very",
+        "بسیار": "very",
+    }
+
+    def __init__(self, lexicon=None):
+        self.lexicon = lexicon if lexicon is not None else self.LEXICON
+
+    def translate(self, text):
+        words = re.findall(r"\S+", str(text))
+        return " ".join(self.lexicon.get(word, word) for word in words)
+
+    def translate_batch(self, batch):
+        return [self.translate(text) for text in batch]
+
+
+_translator = None
+_translator_lock = threading.Lock()
+
+
+def build_translator(name=None):
+    """Build a translator by name: "google" (default) or "local"."""
+    name = name or os.getenv("SENTIMENT_TRANSLATOR", "google")
+    if name == "local":
+        return LocalStandInTranslator()
+    if name == "google":
+        from deep_translator import GoogleTranslator
+        return GoogleTranslator(source="auto", target="en")
+    raise ValueError(f"Unknown translator: {name}")
+
+
+def get_translator():
+    global _translator
+    if _translator is None:
+        with _translator_lock:
+            if _translator is None:
+                _translator = build_translator()
+    return _translator
+
+
+def set_translator(translator):
+    """Plug in any object with translate(text) and translate_batch(list) methods."""
+    global _translator
+    with _translator_lock:
+        _translator = translator
+
+
+def translation_version(translator=None):
+    translator = translator or get_translator()
+    return f"translation:{getattr(translator, 'name', type(translator).__name__)}:en"
+
+
+def translate_texts(logger, texts, batch_size=None):
+    """
+    Translate a list of texts to English, in input order.
+    Cached texts are served from the cache; the rest are sent with translate_batch
+    in chunks of batch_size. A failed chunk is retried one text at a time and a
+    text that still fails comes back as None.
+    """
+    batch_size = batch_size or TRANSLATION_BATCH_SIZE
+    translator = get_translator()
+    cache = get_sentiment_cache()
+    version = translation_version(translator)
+
+    results = {}
+    for text in texts:
+        if text not in results:
+            results[text] = cache.get(version, text) if cache is not None and isinstance(text, str) else None
+
+    missing = [text for text, translated in results.items() if translated is None and isinstance(text, str) and text.strip()]
+    for start in range(0, len(missing), batch_size):
+        chunk = missing[start:start + batch_size]
+        try:
+            translated = translator.translate_batch(chunk)
+            if len(translated) != len(chunk):
+                raise ValueError(f"Translator returned {len(translated)} texts for {len(chunk)} inputs.")
+        except Exception as e:
+            logger.error(f"Error in translate_batch, falling back to single texts: {e}", exc_info=False)
+            translated = []
+            for text in chunk:
+                try:
+                    translated.append(translator.translate(text))
+                except Exception as single_error:
+                    logger.error(f"Error translating text: {single_error}", exc_info=False)
+                    translated.append(None)
+
+        results.update(zip(chunk, translated))
+        if cache is not None:
+            cache.put_many(version, [(text, english) for text, english in zip(chunk, translated) if english])
+
+    logger.debug(f"Translation: {len(texts) - len(missing)} of {len(texts)} texts served from cache")
+    return [results[text] for text in texts]
@@ -1,6 +1,7 @@
 import csv
 import hashlib
 import os
+import re
 import sys
 from dataclasses import dataclass
 from datetime import datetime
@@ -43,6 +44,22 @@ def hash_string(value: str) -> str:
     return hashlib.sha256(s.encode("utf-8")).hexdigest()
 
 
+def normalize_content(value: str | None) -> str:
+    # same normalization as repetitive detection: collapse whitespace, strip the ends
+    return re.sub(r"\s+", " ", (value or "").strip())
+
+
+def content_hash(title: str | None, description: str | None) -> str | None:
+    """
+    SHA-256 of the normalized description + title, used to find repeated comments.
+    None for an empty description (those comments are never checked for repeats).
+    """
+    description = normalize_content(description)
+    if not description:
+        return None
+    return hashlib.sha256(f"{description}\x1f{normalize_content(title)}".encode("utf-8")).hexdigest()
+
+
 def parse_timestamp(ts: str) -> datetime:
     ts = ts.strip()
 
@@ -102,15 +119,29 @@ def create_table(conn):
         sentiment_result TEXT,
         sentiment_score INTEGER,
         second_model_processed BOOLEAN,
-        is_repetitive BOOLEAN,
+        sentiment_source TEXT,
+        sentiment_version TEXT,
+        is_repetitive BOOLEAN DEFAULT FALSE,
         duplicate_of INTEGER,
+        near_duplicate_cluster INTEGER,
         channel_code VARCHAR(50),
+        content_hash VARCHAR(64),
         UNIQUE(national_code_hash, created_at)
     );
 
+    ALTER TABLE dima_comments ADD COLUMN IF NOT EXISTS content_hash VARCHAR(64);
+    ALTER TABLE dima_comments ADD COLUMN IF NOT EXISTS sentiment_source TEXT;
+    ALTER TABLE dima_comments ADD COLUMN IF NOT EXISTS sentiment_version TEXT;
+
     CREATE INDEX IF NOT EXISTS idx_comments_national_code_hash ON dima_comments(national_code_hash);
     CREATE INDEX IF NOT EXISTS idx_comments_grade ON dima_comments(grade);
     CREATE INDEX IF NOT EXISTS idx_comments_channel_code ON dima_comments(channel_code);
+    CREATE INDEX IF NOT EXISTS idx_comments_content_hash ON dima_comments(national_code_hash, content_hash, created_at);
+    CREATE INDEX IF NOT EXISTS idx_comments_near_duplicate_cluster ON dima_comments(near_duplicate_cluster)
+        WHERE near_duplicate_cluster IS NOT NULL;
+    CREATE INDEX IF NOT EXISTS idx_comments_scored_recent ON dima_comments(created_at DESC, id DESC)
+        INCLUDE (sentiment_version, sentiment_source)
+        WHERE sentiment_result IS NOT NULL AND sentiment_result <> '';
     """
     with conn.cursor() as cur:
         cur.execute(create_sql)
@@ -194,8 +225,9 @@ def insert_comments(conn, comments: List[Comment]):
         national_code_hash,
         mobile_no_hash,
         channel_code,
-        created_at
-    ) VALUES (%s, %s, %s, %s, %s, %s, %s)
+        created_at,
+        content_hash
+    ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
     ON CONFLICT (national_code_hash, created_at)
     DO UPDATE SET
         title = EXCLUDED.title,
@@ -203,6 +235,7 @@ def insert_comments(conn, comments: List[Comment]):
         description = EXCLUDED.description,
         mobile_no_hash = EXCLUDED.mobile_no_hash,
         channel_code = COALESCE(dima_comments.channel_code, EXCLUDED.channel_code),
+        content_hash = EXCLUDED.content_hash,
 
         imported_at = CURRENT_TIMESTAMP;
     """
@@ -216,13 +249,84 @@ def insert_comments(conn, comments: List[Comment]):
             c.mobile_no_hash if c.mobile_no_hash else None,
             c.channel_code,
             c.created_at,
+            content_hash(c.title, c.description),
         )
         for c in comments
     ]
 
+    # Check each new comment against the user's earlier comments in time order, so a
+    # repeat inside the same file finds the comment it repeats already inserted
+    checks = sorted(
+        (
+            {"national_code_hash": row[3], "created_at": row[6], "content_hash": row[7]}
+            for row in rows
+            if row[7] is not None
+        ),
+        key=lambda check: (check["national_code_hash"], check["created_at"])
+    )
+
     with conn.cursor() as cur:
         execute_batch(cur, upsert_sql, rows, page_size=1000)
+        execute_batch(cur, DUPLICATE_CHECK_SQL, checks, page_size=1000)
     conn.commit()
     print(f"✅ Completed: {len(rows)} comments inserted/updated")
 
 
+# A new comment repeats the user's last kept (non-repetitive) comment with the same
+# content_hash if it was posted at most 1 hour earlier and no comment with different
+# content came in between (same rule as repetitive_detection.flag_repetitive_comments).
+# Both lookups are probes on idx_comments_content_hash and the (national_code_hash,
+# created_at) unique index.
+DUPLICATE_CHECK_SQL = """
+UPDATE dima_comments AS d
+SET is_repetitive = TRUE, duplicate_of = anchor.id
+FROM (
+    SELECT k.id, k.created_at
+    FROM dima_comments k
+    WHERE k.national_code_hash = %(national_code_hash)s
+      AND k.content_hash = %(content_hash)s
+      AND k.created_at < %(created_at)s
+      AND k.created_at >= %(created_at)s - INTERVAL '1 hour'
+      AND k.is_repetitive IS NOT TRUE
+      AND (k.sentiment_result IS NULL OR k.sentiment_result = '')
+    ORDER BY k.created_at DESC
+    LIMIT 1
+) AS anchor
+WHERE d.national_code_hash = %(national_code_hash)s
+  AND d.created_at = %(created_at)s
+  AND (d.sentiment_result IS NULL OR d.sentiment_result = '')
+  AND NOT EXISTS (
+      SELECT 1 FROM dima_comments m
+      WHERE m.national_code_hash = %(national_code_hash)s
+        AND m.created_at > anchor.created_at
+        AND m.created_at < %(created_at)s
+        AND m.content_hash != %(content_hash)s
+        AND (m.sentiment_result IS NULL OR m.sentiment_result = '')
+  );
+"""
+
+
+def backfill_content_hashes(conn, batch_size: int = 5000) -> int:
+    """Fill content_hash for rows imported before the column existed. Returns the number of rows updated."""
+    updated = 0
+    last_id = 0
+    while True:
+        with conn.cursor() as cur:
+            cur.execute("""
+                SELECT id, title, description FROM dima_comments
+                WHERE content_hash IS NULL AND id > %s
+                  AND description IS NOT NULL AND description != ''
+                ORDER BY id
+                LIMIT %s;
+            """, (last_id, batch_size))
+            rows = cur.fetchall()
+            if not rows:
+                break
+            last_id = rows[-1][0]
+            hashes = [(content_hash(title, description), id_) for id_, title, description in rows]
+            execute_batch(cur, "UPDATE dima_comments SET content_hash = %s WHERE id = %s;", hashes, page_size=1000)
+        conn.commit()
+        updated += len(rows)
+    return updated
+
+
@@ -0,0 +1,40 @@
+import json
+import sys
+from connect_to_database_func import connect_db
+from cafe_bazar_app.logging_config import setup_logger
+from cafe_bazar_app.sentiment_model_func import check_backend_parity
+from cafe_bazar_app.translation_func import translate_texts
+
+logger_parity = setup_logger(name="backend_parity", log_file="backend_parity.log")
+
+
+# Random sample of non-empty comments to compare the quantized backend with fp32
+def fetch_parity_sample(logger, sample_size=200):
+    try:
+        conn = connect_db()
+        cursor = conn.cursor()
+        cursor.execute("""
+            SELECT description
+            FROM dima_comments
+            WHERE description IS NOT NULL AND TRIM(description) <> ''
+            ORDER BY RANDOM()
+            LIMIT %s;
+        """, (sample_size,))
+        texts = [row[0] for row in cursor.fetchall()]
+        cursor.close()
+        conn.close()
+        return texts
+    except Exception as e:
+        logger.error(f"Error fetching parity sample from dima_comments: {e}", exc_info=True)
+        return []
+
+
+if __name__ == "__main__":
+    # usage: python main_backend_parity.py [int8|onnx] [sample_size]
+    backend = sys.argv[1] if len(sys.argv) > 1 else "int8"
+    sample_size = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+
+    texts = fetch_parity_sample(logger_parity, sample_size)
+    english_texts = [t for t in translate_texts(logger_parity, texts) if t]
+    report = check_backend_parity(logger_parity, texts, backend=backend, english_texts=english_texts)
+    print(json.dumps(report, ensure_ascii=False, indent=2))
@@ -0,0 +1,10 @@
+from cafe_bazar_app.logging_config import setup_logger
+from near_duplicate_detection import flag_near_duplicate_comments
+
+logger_near_duplicate_dima = setup_logger(name="near_duplicate_comments", log_file="near_duplicate_dima.log")
+
+if __name__ == "__main__":
+    # Separate from main_sentiment.py: the first run signs and indexes every comment
+    logger_near_duplicate_dima.info("✅ Clustering near-duplicate new comments...")
+    near_count = flag_near_duplicate_comments()
+    logger_near_duplicate_dima.info(f"✅ Near-duplicate detection finished. Clustered {near_count} new comments.")
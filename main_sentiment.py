@@ -1,4 +1,5 @@
-from analyze_sentiment_dima import analyze_and_update_sentiment, fetch_comments_to_analyze
+from analyze_sentiment_dima import run_sentiment_pipeline_dima, run_sentiment_sharded_dima
+from cafe_bazar_app.sentiment_sharding import SENTIMENT_WORKERS
 from cafe_bazar_app.logging_config import setup_logger
 from repetitive_detection import flag_repetitive_comments
 
@@ -15,10 +16,10 @@ if __name__ == "__main__":
 
     logger_sentiment_dima.info("🚀 Starting sentiment analysis...")
 
-    while True:
-        comments = fetch_comments_to_analyze(logger_sentiment_dima,limit=100)
-        if not comments:
-            break
-        analyze_and_update_sentiment(logger_sentiment_dima,comments)
+    # SENTIMENT_WORKERS > 1 forks one worker process per id shard (backfills)
+    if SENTIMENT_WORKERS > 1:
+        result = run_sentiment_sharded_dima(logger_sentiment_dima, num_workers=SENTIMENT_WORKERS, limit=100)
+    else:
+        result = run_sentiment_pipeline_dima(logger_sentiment_dima, limit=100)
 
-    logger_sentiment_dima.info(f"✅ Sentiment analysis is finished")
+    logger_sentiment_dima.info(f"✅ Sentiment analysis is finished ({result['processed_comments']} comments)")
@@ -0,0 +1,50 @@
+import json
+import sys
+from connect_to_database_func import connect_db
+from cafe_bazar_app.logging_config import setup_logger
+from cafe_bazar_app.sentiment_model_func import SENTIMENT_LABELS, FIRST_MODEL_SOURCE
+from cafe_bazar_app.distilled_sentiment import train_distilled_model, save_distilled_model, DISTILLED_MODEL_PATH
+
+logger_distilled = setup_logger(name="distilled_sentiment", log_file="distilled_sentiment.log")
+
+
+# MT5 labels already stored in dima_comments. Only rows whose sentiment_source says MT5 produced
+# the label: phrase-rule, fallback-model and distilled-model labels (its own outputs) are left out
+def fetch_training_labels(logger, limit=None):
+    try:
+        conn = connect_db()
+        cursor = conn.cursor()
+        query = """
+            SELECT description, sentiment_result
+            FROM dima_comments
+            WHERE sentiment_result = ANY(%s)
+              AND sentiment_source = %s
+              AND description IS NOT NULL AND TRIM(description) <> ''
+            ORDER BY id DESC
+        """
+        params = [SENTIMENT_LABELS, FIRST_MODEL_SOURCE]
+        if limit:
+            query += " LIMIT %s"
+            params.append(limit)
+        cursor.execute(query + ";", params)
+        rows = cursor.fetchall()
+        cursor.close()
+        conn.close()
+        logger.info(f"Fetched {len(rows)} labelled comments from dima_comments.")
+        return rows
+    except Exception as e:
+        logger.error(f"Error fetching training labels from dima_comments: {e}", exc_info=True)
+        return []
+
+
+if __name__ == "__main__":
+    # usage: python main_train_distilled.py [limit]
+    limit = int(sys.argv[1]) if len(sys.argv) > 1 else None
+
+    rows = fetch_training_labels(logger_distilled, limit)
+    if not rows:
+        sys.exit("No labelled comments to train on.")
+    model = train_distilled_model(logger_distilled, [text for text, _ in rows], [label for _, label in rows])
+    save_distilled_model(model)
+    logger_distilled.info(f"✅ Distilled model {model['version']} saved to {DISTILLED_MODEL_PATH}")
+    print(json.dumps(model["report"], ensure_ascii=False, indent=2))
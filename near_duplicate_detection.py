@@ -0,0 +1,347 @@
+import hashlib
+import os
+import random
+import numpy as np
+from psycopg2.extras import execute_values
+from connect_to_database_func import connect_db
+from import_comments import normalize_content
+from preprocessing_func import character_table, normalize_characters
+from repetitive_detection import ensure_repetitive_state
+
+# Near-duplicate detection across users (copy-paste campaigns, lightly edited spam).
+# Every comment gets a MinHash signature over character shingles of its normalized
+# description. The signature is cut into bands; comments that share a band bucket are
+# candidates, and candidates whose signatures agree on at least NEAR_DUP_THRESHOLD of
+# the positions (estimated Jaccard similarity) join the same cluster.
+# Buckets and signatures are stored in Postgres, so each run only hashes and looks up
+# the comments imported since the last run (watermark 'near_duplicate').
+# It runs as its own job (main_near_duplicates.py / the near_duplicate_dima RPC method),
+# not before sentiment scoring: the first run indexes the whole history.
+
+NEAR_DUP_SHINGLE_SIZE = int(os.getenv("NEAR_DUP_SHINGLE_SIZE", "5"))
+NEAR_DUP_BANDS = int(os.getenv("NEAR_DUP_BANDS", "32"))
+NEAR_DUP_ROWS = int(os.getenv("NEAR_DUP_ROWS", "4"))
+NEAR_DUP_THRESHOLD = float(os.getenv("NEAR_DUP_THRESHOLD", "0.7"))
+NEAR_DUP_PAGE_SIZE = int(os.getenv("NEAR_DUP_PAGE_SIZE", "2000"))
+# Comments with fewer shingles are not signed: short common comments ("عالی", "خوبه") from
+# unrelated users would all share one signature. Exact repeats of those are left to
+# repetitive_detection.
+NEAR_DUP_MIN_SHINGLES = int(os.getenv("NEAR_DUP_MIN_SHINGLES", "10"))
+# Stored candidates fetched per bucket (one representative per cluster)
+NEAR_DUP_BUCKET_LIMIT = int(os.getenv("NEAR_DUP_BUCKET_LIMIT", "20"))
+# Shingles hashed per numpy block (memory is about 8 * 128 bytes per shingle and temporary)
+NEAR_DUP_SHINGLE_BLOCK = int(os.getenv("NEAR_DUP_SHINGLE_BLOCK", "8192"))
+
+# Persian/English digits, Arabic/Persian letters, diacritics and half spaces do not make comments different
+_SHINGLE_TABLE = character_table(
+    convert_farsi_numbers=True, convert_arabic_characters=True, remove_diacritic=True, remove_halfspace=True
+)
+
+_MERSENNE_PRIME = (1 << 61) - 1
+_MAX_HASH = (1 << 32) - 1
+# Fixed seed: signatures stored by earlier runs must stay comparable
+_rng = random.Random(1)
+_PERMUTATIONS = [
+    (_rng.randrange(1, _MERSENNE_PRIME), _rng.randrange(0, _MERSENNE_PRIME))
+    for _ in range(NEAR_DUP_BANDS * NEAR_DUP_ROWS)
+]
+_PERM_A = np.array([a for a, _ in _PERMUTATIONS], dtype=np.uint64)
+_PERM_B = np.array([b for _, b in _PERMUTATIONS], dtype=np.uint64)
+_P = np.uint64(_MERSENNE_PRIME)
+_LOW32 = np.uint64((1 << 32) - 1)
+_LOW29 = np.uint64((1 << 29) - 1)
+
+
+def _mod_mersenne(x):
+    """x mod 2^61 - 1 for any uint64 x (2^61 = 1 mod p)."""
+    x = (x >> np.uint64(61)) + (x & _P)
+    return np.where(x >= _P, x - _P, x)
+
+
+def _mul_mod_mersenne(a, x):
+    """a * x mod 2^61 - 1 for uint64 a, x < 2^61, exact in 64-bit pieces."""
+    a_hi, a_lo = a >> np.uint64(32), a & _LOW32
+    x_hi, x_lo = x >> np.uint64(32), x & _LOW32
+    # a * x = a_hi*x_hi * 2^64 + mid * 2^32 + a_lo*x_lo, with 2^64 = 8 and 2^61 = 1 (mod p)
+    mid = a_hi * x_lo + a_lo * x_hi
+    low = a_lo * x_lo
+    total = (
+        ((a_hi * x_hi) << np.uint64(3))
+        + (mid >> np.uint64(29))
+        + ((mid & _LOW29) << np.uint64(32))
+        + (low >> np.uint64(61))
+        + (low & _P)
+    )
+    return _mod_mersenne(total)
+
+
+def shingles(text, size=None):
+    """Set of character shingles of the normalized, lower-cased text."""
+    size = size or NEAR_DUP_SHINGLE_SIZE
+    text = normalize_content(normalize_characters(text or "", _SHINGLE_TABLE)).lower()
+    return {text[i:i + size] for i in range(len(text) - size + 1)}
+
+
+def shingle_hashes(text):
+    """64-bit hashes of the text's shingles."""
+    return [
+        int.from_bytes(hashlib.blake2b(shingle.encode("utf-8"), digest_size=8).digest(), "little")
+        for shingle in shingles(text)
+    ]
+
+
+def minhash_signatures(texts):
+    """
+    MinHash signatures (NEAR_DUP_BANDS * NEAR_DUP_ROWS values each) for a list of texts, in
+    order; None for a text with fewer than NEAR_DUP_MIN_SHINGLES shingles.
+    Every permutation is ((a * h + b) mod 2^61 - 1) & 0xFFFFFFFF, minimized over the shingle
+    hashes h. The shingles of many texts are stacked into one (shingles x permutations)
+    numpy block of about NEAR_DUP_SHINGLE_BLOCK rows, reduced per text with reduceat.
+    """
+    hashes = [shingle_hashes(text) for text in texts]
+    signed = [i for i, text_hashes in enumerate(hashes) if len(text_hashes) >= NEAR_DUP_MIN_SHINGLES]
+    signatures = [None] * len(texts)
+
+    start = 0
+    while start < len(signed):
+        end, rows = start, 0
+        while end < len(signed) and (end == start or rows + len(hashes[signed[end]]) <= NEAR_DUP_SHINGLE_BLOCK):
+            rows += len(hashes[signed[end]])
+            end += 1
+        block = signed[start:end]
+        values = _mod_mersenne(np.array([h for i in block for h in hashes[i]], dtype=np.uint64))
+        permuted = _mod_mersenne(_mul_mod_mersenne(_PERM_A[None, :], values[:, None]) + _PERM_B[None, :])
+        offsets = np.cumsum([0] + [len(hashes[i]) for i in block[:-1]])
+        minima = np.minimum.reduceat(permuted & np.uint64(_MAX_HASH), offsets, axis=0)
+        for i, signature in zip(block, minima.tolist()):
+            signatures[i] = signature
+        start = end
+    return signatures
+
+
+def minhash_signature(text):
+    """MinHash signature of one text (see minhash_signatures); None when it is too short to sign."""
+    return minhash_signatures([text])[0]
+
+
+def band_buckets(signature):
+    """(band, bucket) keys of a signature; bucket is a signed 64-bit hash of the band's rows."""
+    buckets = []
+    for band in range(NEAR_DUP_BANDS):
+        rows = signature[band * NEAR_DUP_ROWS:(band + 1) * NEAR_DUP_ROWS]
+        digest = hashlib.blake2b(",".join(map(str, rows)).encode("ascii"), digest_size=8).digest()
+        buckets.append((band, int.from_bytes(digest, "little", signed=True)))
+    return buckets
+
+
+def estimated_similarity(signature_a, signature_b):
+    return sum(a == b for a, b in zip(signature_a, signature_b)) / len(signature_a)
+
+
+def ensure_near_duplicate_tables(cur):
+    ensure_repetitive_state(cur)
+    cur.execute("""
+        ALTER TABLE dima_comments ADD COLUMN IF NOT EXISTS near_duplicate_cluster INTEGER;
+        -- cluster merges relabel members by cluster id
+        CREATE INDEX IF NOT EXISTS idx_comments_near_duplicate_cluster
+            ON dima_comments(near_duplicate_cluster) WHERE near_duplicate_cluster IS NOT NULL;
+
+        CREATE TABLE IF NOT EXISTS near_duplicate_signatures (
+            comment_id INTEGER PRIMARY KEY,
+            signature BIGINT[] NOT NULL,
+            cluster_id INTEGER
+        );
+        CREATE INDEX IF NOT EXISTS idx_near_duplicate_signatures_cluster ON near_duplicate_signatures(cluster_id);
+
+        CREATE TABLE IF NOT EXISTS near_duplicate_buckets (
+            band SMALLINT NOT NULL,
+            bucket BIGINT NOT NULL,
+            comment_id INTEGER NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS idx_near_duplicate_buckets ON near_duplicate_buckets(band, bucket);
+
+        INSERT INTO repetitive_detection_state (name, last_id) VALUES ('near_duplicate', 0)
+        ON CONFLICT (name) DO NOTHING;
+    """)
+
+
+def sign_comments(rows):
+    """[(comment_id, signature)] for the (comment_id, description) rows long enough to sign."""
+    signatures = minhash_signatures([description for _, description in rows])
+    return [(comment_id, signature) for (comment_id, _), signature in zip(rows, signatures) if signature is not None]
+
+
+def fetch_candidates(cur, buckets, limit=None):
+    """
+    Stored comments sharing any of the (band, bucket) keys: {(band, bucket): [comment_id]}, {comment_id: (signature, cluster_id)}.
+    A bucket returns one representative (smallest id) per cluster and at most limit rows,
+    so a popular text does not return every earlier copy.
+    """
+    limit = limit or NEAR_DUP_BUCKET_LIMIT
+    if not buckets:
+        return {}, {}
+    cur.execute("""
+        SELECT band, bucket, comment_id, signature, cluster_id
+        FROM (
+            SELECT reps.*, ROW_NUMBER() OVER (PARTITION BY band, bucket ORDER BY comment_id) AS bucket_rn
+            FROM (
+                SELECT DISTINCT ON (b.band, b.bucket, COALESCE(s.cluster_id, s.comment_id))
+                       b.band, b.bucket, s.comment_id, s.signature, s.cluster_id
+                FROM near_duplicate_buckets b
+                JOIN near_duplicate_signatures s ON s.comment_id = b.comment_id
+                WHERE (b.band, b.bucket) IN (SELECT * FROM unnest(%s::SMALLINT[], %s::BIGINT[]))
+                ORDER BY b.band, b.bucket, COALESCE(s.cluster_id, s.comment_id), s.comment_id
+            ) reps
+        ) ranked
+        WHERE bucket_rn <= %s;
+    """, ([band for band, _ in buckets], [bucket for _, bucket in buckets], limit))
+    index = {}
+    stored = {}
+    for band, bucket, comment_id, signature, cluster_id in cur.fetchall():
+        index.setdefault((band, bucket), []).append(comment_id)
+        stored[comment_id] = (signature, cluster_id)
+    return index, stored
+
+
+def cluster_page(comments, index, stored):
+    """
+    Match every new comment (in id order) against the stored comments and the earlier
+    comments of the same page. A cluster id is the smallest comment id in the cluster;
+    when a comment links two clusters they are merged into the smaller id.
+    Exact copies (identical signature) of an indexed comment join its cluster but add no
+    bucket rows, so buckets of copy-paste campaigns stop growing.
+    comments: [(comment_id, signature)]
+    Returns ({comment_id: cluster_id} for every clustered comment seen, {old_cluster_id: new_cluster_id},
+    [comment_id] of the new comments whose buckets must be stored)
+    """
+    clusters = {comment_id: cluster_id for comment_id, (_, cluster_id) in stored.items() if cluster_id is not None}
+    signatures = {comment_id: signature for comment_id, (signature, _) in stored.items()}
+    merged = {}
+    indexed = []
+
+    def resolve(cluster_id):
+        while cluster_id in merged:
+            cluster_id = merged[cluster_id]
+        return cluster_id
+
+    for comment_id, signature in comments:
+        buckets = band_buckets(signature)
+        candidates = {other for key in buckets for other in index.get(key, ()) if other != comment_id}
+        similarities = {other: estimated_similarity(signature, signatures[other]) for other in candidates}
+        matches = [other for other, similarity in similarities.items() if similarity >= NEAR_DUP_THRESHOLD]
+        if matches:
+            linked = {resolve(clusters.get(other, other)) for other in matches}
+            cluster_id = min(linked | {comment_id})
+            for old in linked - {cluster_id}:
+                merged[old] = cluster_id
+            for other in matches + [comment_id]:
+                clusters[other] = cluster_id
+        signatures[comment_id] = signature
+        if any(similarity == 1.0 for similarity in similarities.values()):
+            continue
+        # later comments of the page can match this one
+        indexed.append(comment_id)
+        for key in buckets:
+            index.setdefault(key, []).append(comment_id)
+
+    clusters = {comment_id: resolve(cluster_id) for comment_id, cluster_id in clusters.items()}
+    merged = {old: resolve(old) for old in merged}
+    return clusters, merged, indexed
+
+
+def flag_near_duplicate_comments(page_size=None):
+    """
+    Cluster near-duplicate comments imported since the last run and write the cluster id
+    to dima_comments.near_duplicate_cluster (next to duplicate_of). Comments without any
+    near duplicate keep NULL. Returns the number of new comments placed in a cluster.
+    """
+    page_size = page_size or NEAR_DUP_PAGE_SIZE
+    try:
+        conn = connect_db()
+        cur = conn.cursor()
+        ensure_near_duplicate_tables(cur)
+        conn.commit()
+
+        clustered_count = 0
+        while True:
+            # Lock the watermark so two runs never index the same rows
+            cur.execute("SELECT last_id FROM repetitive_detection_state WHERE name = 'near_duplicate' FOR UPDATE;")
+            watermark = cur.fetchone()[0]
+            cur.execute("""
+                SELECT id, description FROM dima_comments
+                WHERE id > %s AND description IS NOT NULL AND description != ''
+                ORDER BY id
+                LIMIT %s;
+            """, (watermark, page_size))
+            rows = cur.fetchall()
+            if not rows:
+                conn.commit()
+                break
+
+            comments = sign_comments(rows)
+            buckets = {key for _, signature in comments for key in band_buckets(signature)}
+            index, stored = fetch_candidates(cur, list(buckets))
+            clusters, merged, indexed = cluster_page(comments, index, stored)
+            indexed = set(indexed)
+
+            # Persist the new part of the index
+            execute_values(
+                cur,
+                "INSERT INTO near_duplicate_signatures (comment_id, signature, cluster_id) VALUES %s ON CONFLICT (comment_id) DO NOTHING;",
+                [(comment_id, signature, clusters.get(comment_id)) for comment_id, signature in comments],
+                page_size=1000
+            )
+            execute_values(
+                cur,
+                "INSERT INTO near_duplicate_buckets (band, bucket, comment_id) VALUES %s;",
+                [
+                    (band, bucket, comment_id)
+                    for comment_id, signature in comments if comment_id in indexed
+                    for band, bucket in band_buckets(signature)
+                ],
+                page_size=5000
+            )
+
+            # Merged clusters: relabel members stored by earlier runs
+            for old, new in merged.items():
+                cur.execute("UPDATE near_duplicate_signatures SET cluster_id = %s WHERE cluster_id = %s;", (new, old))
+                cur.execute("UPDATE dima_comments SET near_duplicate_cluster = %s WHERE near_duplicate_cluster = %s;", (new, old))
+
+            if clusters:
+                execute_values(
+                    cur,
+                    """
+                    UPDATE near_duplicate_signatures AS s SET cluster_id = v.cluster_id
+                    FROM (VALUES %s) AS v (comment_id, cluster_id)
+                    WHERE s.comment_id = v.comment_id;
+                    """,
+                    list(clusters.items()),
+                    page_size=1000
+                )
+                execute_values(
+                    cur,
+                    """
+                    UPDATE dima_comments AS d SET near_duplicate_cluster = v.cluster_id
+                    FROM (VALUES %s) AS v (comment_id, cluster_id)
+                    WHERE d.id = v.comment_id;
+                    """,
+                    list(clusters.items()),
+                    page_size=1000
+                )
+
+            new_ids = {comment_id for comment_id, _ in comments}
+            clustered_count += sum(comment_id in clusters for comment_id in new_ids)
+            cur.execute("""
+                UPDATE repetitive_detection_state SET last_id = %s, updated_at = CURRENT_TIMESTAMP
+                WHERE name = 'near_duplicate';
+            """, (rows[-1][0],))
+            conn.commit()
+
+        cur.close()
+        conn.close()
+        print(f"✅ Near-duplicate detection completed. Placed {clustered_count} new comments in clusters.")
+        return clustered_count
+
+    except Exception as e:
+        print(f"❌ Error in flag_near_duplicate_comments: {e}")
+        return 0
@@ -1,4 +1,5 @@
 import re
+from functools import lru_cache
 from typing import List, Optional
 import string
 
@@ -6,93 +7,145 @@ def _multiple_replace(mapping, text):
     pattern = "|".join(map(re.escape, mapping.keys()))
     return re.sub(pattern, lambda m: mapping[m.group()], str(text))
 
+FA_NUMBERS = {
+    '۰': '0',
+    '۱': '1',
+    '۲': '2',
+    '۳': '3',
+    '۴': '4',
+    '۵': '5',
+    '۶': '6',
+    '۷': '7',
+    '۸': '8',
+    '۹': '9',
+    '.': '.',
+}
+FA_NUMBERS_TABLE = str.maketrans(FA_NUMBERS)
+
 def convert_fa_numbers(input_str):
-    mapping = {
-        '۰': '0',
-        '۱': '1',
-        '۲': '2',
-        '۳': '3',
-        '۴': '4',
-        '۵': '5',
-        '۶': '6',
-        '۷': '7',
-        '۸': '8',
-        '۹': '9',
-        '.': '.',
-    }
-    return _multiple_replace(mapping, input_str)
+    return str(input_str).translate(FA_NUMBERS_TABLE)
+
+EN_NUMBERS = {
+    '0': '۰',
+    '1': '۱',
+    '2': '۲',
+    '3': '۳',
+    '4': '۴',
+    '5': '۵',
+    '6': '۶',
+    '7': '۷',
+    '8': '۸',
+    '9': '۹',
+    '.': '.',
+}
+EN_NUMBERS_TABLE = str.maketrans(EN_NUMBERS)
 
 def convert_en_numbers(input_str):
-    mapping = {
-         '0': '۰',
-         '1' : '۱',
-         '2' :'۲',
-        '3'  :'۳',
-        '4'  :'۴',
-        '5' :'۵',
-        '6' :'۶',
-        '7' :'۷',
-        '8' :'۸',
-        '9' :'۹',
-        '.' :'.'
-    }
-    return _multiple_replace(mapping, input_str)
+    return str(input_str).translate(EN_NUMBERS_TABLE)
+
+# Arabic chars and the related Persian unicode char
+AR_CHARACTERS = {
+    'ك': 'ک',
+    'ى': 'ی',
+    'ي': 'ی',
+    'ئ': 'ی',
+    'إ': 'ا',
+    'أ': 'ا',
+    'ة': 'ه',
+    'ؤ': 'و',
+}
+AR_CHARACTERS_TABLE = str.maketrans(AR_CHARACTERS)
 
 def convert_ar_characters(input_str):
     """
     Converts Arabic chars to related Persian unicode char
     """
-    mapping = {
-        'ك': 'ک',
-        'ى': 'ی',
-        'ي': 'ی',
-        'ئ':'ی',
-        'إ':'ا',
-        'أ':'ا',
-        'ة':'ه',
-        'ؤ':'و'
-    }
-    return _multiple_replace(mapping, input_str)
+    return str(input_str).translate(AR_CHARACTERS_TABLE)
 
 #-------------------------------------------------------------------------------------------
 
 
+_MI_PREFIX = re.compile(r'\b(ن?می)\s+(\S+)')
+# zero-width non-joiner; the replacement is NOT a raw string, so \u200C is interpreted properly
+_MI_REPLACEMENT = r'\1' + '\u200C' + r'\2'
+
 def merge_mi_prefix(text):
-    zwnj = '\u200C'    # zero-width non-joiner
-    # note: replacement is NOT a raw string, so \u200C is interpreted properly
-    replacement = r'\1' + zwnj + r'\2'
-    return re.sub(r'\b(ن?می)\s+(\S+)', replacement, text)
+    return _MI_PREFIX.sub(_MI_REPLACEMENT, text)
+
+# Persian diacritics (Unicode range: \u064B-\u0652) are deleted
+DIACRITICS_TABLE = dict.fromkeys(range(0x064B, 0x0652 + 1))
 
 def remove_diacritics(text):
-    # define regex for Persian diacritics (Unicode range: \u064B-\u0652)
-    diacritics_pattern = re.compile(r'[\u064B-\u0652]')
-    return re.sub(diacritics_pattern, '', text)
+    return text.translate(DIACRITICS_TABLE)
 
 
+_NUMBER_RUN = re.compile(r'(\d)\d*')
+
 def convert_number_to_text(text):
     
-    return re.sub(r'(\d)\d*', r'\1', text)
+    return _NUMBER_RUN.sub(r'\1', text)
+
+HALF_SPACE_TABLE = {0x200C: None}
 
 def remove_half_space(text):
 
     text = text.replace('\u200c', '')
     return text
 
+
+def compose_tables(*tables):
+    """One str.translate table with the same effect as applying the tables in order."""
+    composed = {}
+    for table in tables:
+        for char, value in composed.items():
+            if value is not None:
+                composed[char] = value.translate(table) or None
+        for char, value in table.items():
+            composed.setdefault(char, value)
+    return composed
+
+
+@lru_cache(maxsize=None)
+def character_table(convert_farsi_numbers=False, convert_arabic_characters=False, remove_diacritic=False, remove_halfspace=False):
+    """
+    Fused table for the character-level preprocess flags, in preprocess order:
+    Persian digits -> English, Arabic -> Persian letters, diacritics and half spaces deleted.
+    Empty dict when no flag is set.
+    """
+    selected = [
+        (convert_farsi_numbers, FA_NUMBERS_TABLE),
+        (convert_arabic_characters, AR_CHARACTERS_TABLE),
+        (remove_diacritic, DIACRITICS_TABLE),
+        (remove_halfspace, HALF_SPACE_TABLE),
+    ]
+    return compose_tables(*[table for enabled, table in selected if enabled])
+
+
+def normalize_characters(text, table):
+    # one pass for all selected character conversions (see character_table)
+    return str(text).translate(table)
+
+_REPEATED_CHAR = re.compile(r'(\w)\1{2,}')
+_SPACE_NUMBER = re.compile(r' [\d+]')
+_NON_WORD = re.compile(r'[^\w\[\]]')
+_MULTIPLE_SPACE = re.compile(r'[\s]{2,}')
+_WHITESPACE = re.compile(r'\s+')
+
 def remove_extra_charecter(text):
 
-    return re.sub(r'(\w)\1{2,}', r'\1\1',text)
+    return _REPEATED_CHAR.sub(r'\1\1',text)
 
 def remove_number(text):
 
-    return re.sub(r' [\d+]', ' ',text)
+    return _SPACE_NUMBER.sub(' ',text)
 
 def remove_punctuation(text):
 
-    return re.sub(r'[^\w\[\]]', ' ', text)
+    return _NON_WORD.sub(' ', text)
 
 def replace_multiple_space(text):
 
-    return re.sub(r'[\s]{2,}', ' ', text)
+    return _MULTIPLE_SPACE.sub(' ', text)
 
 
 def map_num_to_text(text):
@@ -106,10 +159,7 @@ def map_num_to_text(text):
     return text 
 #--------------------------------------------------------------------------------------------------------
 
-def remove_punctuation_except_keep(
-    text: str,
-    keep: Optional[List[str]] = None
-) -> str:
+def compile_punctuation_except_keep(keep: Optional[List[str]] = None):
     # Determine which chars to keep 
     default_keep = []
     # default_keep = ['(', ')', '،', '؟', '؛', '«', '»']
@@ -125,12 +175,20 @@ def remove_punctuation_except_keep(
 
     # Build regex and clean 
     # [chars]+ will match any run of unwanted punctuation
-    pattern = re.compile("[" + re.escape("".join(remove_chars)) + "]+")
+    return re.compile("[" + re.escape("".join(remove_chars)) + "]+")
+
+def replace_punctuation(pattern, text: str) -> str:
     # replace with a single space, then collapse multiple spaces
     cleaned = pattern.sub(" ", text)
-    cleaned = re.sub(r"\s+", " ", cleaned).strip()
+    cleaned = _WHITESPACE.sub(" ", cleaned).strip()
     return cleaned
 
+def remove_punctuation_except_keep(
+    text: str,
+    keep: Optional[List[str]] = None
+) -> str:
+    return replace_punctuation(compile_punctuation_except_keep(keep), text)
+
 
 
 # Split sentences on . ! ? followed by whitespace
@@ -150,56 +208,70 @@ def drop_short_sentences(text: str, min_words: int = 0) -> str:
 
 
 
-def remove_phrases(text: str, phrases: List[str] = []) -> str:
-    if not phrases:
-        return text.strip()
-    
-    # 1) Escape and join into an alternation
+def compile_phrases(phrases: List[str]):
+    # Escape and join into an alternation
     escaped = [re.escape(p) for p in phrases]
-    pattern = re.compile(
+    return re.compile(
         r'\s*(?:' + "|".join(escaped) + r')\s*'
     )
-    
-    # 2) Delete them
+
+def delete_phrases(pattern, text: str) -> str:
+    # Delete them
     cleaned = pattern.sub(' ', text)
-    # 3) Collapse multiple spaces, trim
-    cleaned = re.sub(r'\s+', ' ', cleaned).strip()
+    # Collapse multiple spaces, trim
+    cleaned = _WHITESPACE.sub(' ', cleaned).strip()
     return cleaned
 
+def remove_phrases(text: str, phrases: List[str] = []) -> str:
+    if not phrases:
+        return text.strip()
+    return delete_phrases(compile_phrases(phrases), text)
+
 
 
 # English + Persian punctuation to pad
 PUNCT_CLASS = r'-\*\.,/"\"!?:;،؟؛«»()\[\]{}"\'…'
 
+_SPACE_BEFORE_PUNC = re.compile(rf'(?<!\s)([{PUNCT_CLASS}])')
+_SPACE_AFTER_PUNC = re.compile(rf'([{PUNCT_CLASS}])(?!\s)')
+
 def add_space_punc(text: str) -> str:
     # 1) ensure a space BEFORE each punctuation (if not already)
-    text = re.sub(rf'(?<!\s)([{PUNCT_CLASS}])', r' \1', text)
+    text = _SPACE_BEFORE_PUNC.sub(r' \1', text)
     # 2) ensure a space AFTER each punctuation (if not already)
-    text = re.sub(rf'([{PUNCT_CLASS}])(?!\s)', r'\1 ', text)
+    text = _SPACE_AFTER_PUNC.sub(r'\1 ', text)
     # 3) clean up
-    return re.sub(r'\s+', ' ', text).strip()
+    return _WHITESPACE.sub(' ', text).strip()
 
-def remove_space_after_words(text:str, words: List[str] = []) -> str:
-    for word in words:
-        # match "word + space(s)" and replace with "word"
-        pattern = rf"{word}\s+"
-        text = re.sub(pattern, word, text)
+# Word lists are applied one pattern after another (a later word can match the output of
+# an earlier one), so they compile to a list of (pattern, replacement) pairs
+def compile_space_after_words(words: List[str]):
+    # match "word + space(s)" and replace with "word"
+    return [(re.compile(rf"{word}\s+"), word) for word in words]
+
+def compile_before_spaces_halfspace(words: List[str]):
+    # Match "space + word" and replace with "half-space + word"
+    return [(re.compile(rf"\s+{word}"), f"\u200c{word}") for word in words]
+
+def apply_word_patterns(patterns, text: str) -> str:
+    for pattern, replacement in patterns:
+        text = pattern.sub(replacement, text)
     return text
 
+def remove_space_after_words(text:str, words: List[str] = []) -> str:
+    return apply_word_patterns(compile_space_after_words(words), text)
+
 
 ## replace space with half space
 def replace_before_spaces_with_halfspace(text:str, words: List[str] = []) -> str:
-    for word in words:
-        # Match "space + word" and replace with "half-space + word"
-        pattern = rf"\s+{word}"
-        text = re.sub(pattern, f"\u200c{word}", text)
-    return text
+    return apply_word_patterns(compile_before_spaces_halfspace(words), text)
 
 # remove ها / های / هایی
+_HA_SUFFIX = re.compile(r'(?:\s|‌)?ها(?:ی(?:ی)?)?\b')
+
 def remove_ha_s_suffix(text):
 
-    pattern = r'(?:\s|‌)?ها(?:ی(?:ی)?)?\b'
-    return re.sub(pattern, '', text)
+    return _HA_SUFFIX.sub('', text)
 
 
 def replace_enter_space(text):
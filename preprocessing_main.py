@@ -1,8 +1,15 @@
 
-from preprocessing_func import convert_fa_numbers, convert_ar_characters, convert_en_numbers,remove_phrases, add_space_punc, remove_space_after_words
-from preprocessing_func import  remove_diacritics, map_num_to_text, merge_mi_prefix, replace_multiple_space, remove_punctuation_except_keep
-from preprocessing_func import remove_half_space, remove_extra_charecter, remove_number, remove_punctuation, drop_short_sentences, replace_before_spaces_with_halfspace
+from preprocessing_func import convert_en_numbers,remove_phrases, add_space_punc, remove_space_after_words
+from preprocessing_func import map_num_to_text, merge_mi_prefix, replace_multiple_space, remove_punctuation_except_keep
+from preprocessing_func import remove_extra_charecter, remove_number, remove_punctuation, drop_short_sentences, replace_before_spaces_with_halfspace
 from preprocessing_func import remove_ha_s_suffix, replace_enter_space
+from preprocessing_func import compile_punctuation_except_keep, replace_punctuation, compile_phrases, delete_phrases
+from preprocessing_func import compile_space_after_words, compile_before_spaces_halfspace, apply_word_patterns
+from preprocessing_func import character_table, normalize_characters
+from functools import partial
+import inspect
+import multiprocessing
+import os
 # import re
 
 
@@ -38,15 +45,11 @@ def preprocess(text,
         text = drop_short_sentences(text, drop_short_phrases)
 
 
-    if convert_farsi_numbers:
-        text = convert_fa_numbers(text)
-
-    if convert_arabic_characters:
-# convert arabic characters to persian
-        text = convert_ar_characters(text)
-
-    if remove_diacritic:
-        text = remove_diacritics(text)
+# convert farsi numbers, convert arabic characters to persian, remove diacritics and
+# remove half space in one str.translate pass (same result as applying them in this order)
+    table = character_table(convert_farsi_numbers, convert_arabic_characters, remove_diacritic, remove_halfspace)
+    if table:
+        text = normalize_characters(text, table)
 
     if remove_removelist:
         removelist = "<>"
@@ -54,10 +57,6 @@ def preprocess(text,
         # text = re.sub(r'[^\w]', ' ', text)
         # text = re.sub(r'((#)[\w]*)','#',text)
     
-    if remove_halfspace:
-# remove half space
-        text = remove_half_space(text)
-    
     if remove_extra_characters:
         text = remove_extra_charecter(text)
 
@@ -113,4 +112,137 @@ def preprocess(text,
     if replace_enter_with_space:
         text = replace_enter_space (text)
 
-    return(text)
\ No newline at end of file
+    return(text)
+
+
+
+# Flag names and defaults of preprocess
+PREPROCESS_FLAGS = {
+    name: parameter.default
+    for name, parameter in inspect.signature(preprocess).parameters.items()
+    if name != "text"
+}
+
+
+class Preprocessor:
+    """
+    preprocess() with a fixed set of flags, built once:
+        normalize = Preprocessor(remove_halfspace=True, replace_multiple_spaces=True)
+        normalize(text)          # same output as preprocess(text, remove_halfspace=True, ...)
+        normalize.map(texts)     # list of outputs, in order
+    The enabled steps are resolved and their regexes compiled in __init__, so a call
+    only runs the steps. Steps are module functions and functools.partial objects,
+    so a Preprocessor can be pickled (e.g. sent to worker processes).
+    """
+
+    def __init__(self, **flags):
+        unknown = set(flags) - set(PREPROCESS_FLAGS)
+        if unknown:
+            raise TypeError(f"Unknown preprocess flags: {', '.join(sorted(unknown))}")
+        self.flags = {**PREPROCESS_FLAGS, **flags}
+        self.steps = self._build_steps(self.flags)
+
+    @staticmethod
+    def _build_steps(flags):
+        # Same order and conditions as preprocess
+        steps = []
+        if flags["drop_short_phrases"] > 0:
+            steps.append(partial(drop_short_sentences, min_words=flags["drop_short_phrases"]))
+        table = character_table(
+            flags["convert_farsi_numbers"], flags["convert_arabic_characters"],
+            flags["remove_diacritic"], flags["remove_halfspace"]
+        )
+        if table:
+            steps.append(partial(normalize_characters, table=table))
+        if flags["remove_extra_characters"]:
+            steps.append(remove_extra_charecter)
+        if flags["map_number_to_text"]:
+            steps.append(map_num_to_text)
+        if flags["remove_numbers"]:
+            steps.append(remove_number)
+        if flags["convert_english_numbers"]:
+            steps.append(convert_en_numbers)
+        if flags["remove_punctuations"]:
+            steps.append(remove_punctuation)
+        if flags["remove_punctuation_exception_keep"]:
+            steps.append(partial(replace_punctuation, compile_punctuation_except_keep(flags["remove_punctuation_exception_keep"])))
+        if flags["replace_multiple_spaces"]:
+            steps.append(replace_multiple_space)
+        if flags["handle_prefix"]:
+            steps.append(merge_mi_prefix)
+        if flags["remove_specific_phrases"]:
+            steps.append(partial(delete_phrases, compile_phrases(flags["remove_specific_phrases"])))
+        if flags["add_spaces_punc"]:
+            steps.append(add_space_punc)
+        if flags["remove_space_after_word"]:
+            steps.append(partial(apply_word_patterns, compile_space_after_words(flags["remove_space_after_word"])))
+        if flags["replace_before_space_with_half_space"]:
+            steps.append(partial(apply_word_patterns, compile_before_spaces_halfspace(flags["replace_before_space_with_half_space"])))
+        if flags["remove_ha_suffix"]:
+            steps.append(remove_ha_s_suffix)
+        if flags["replace_enter_with_space"]:
+            steps.append(replace_enter_space)
+        return steps
+
+    def __call__(self, text):
+        text = text.strip()
+        for step in self.steps:
+            text = step(text)
+        return text
+
+    def map(self, texts):
+        return [self(text) for text in texts]
+
+
+# Batch preprocessing
+# The process pool is opt-in: with PREPROCESS_WORKERS > 1 (capped at the CPU count),
+# inputs with at least PREPROCESS_PARALLEL_MIN texts are split into chunks of
+# PREPROCESS_CHUNK_SIZE and run on forked processes. By default (1) everything runs in
+# this process, which keeps the RPC server threads from forking a pool.
+PREPROCESS_WORKERS = int(os.getenv("PREPROCESS_WORKERS", "1"))
+PREPROCESS_CHUNK_SIZE = int(os.getenv("PREPROCESS_CHUNK_SIZE", "2000"))
+PREPROCESS_PARALLEL_MIN = int(os.getenv("PREPROCESS_PARALLEL_MIN", "20000"))
+
+# Compiled profile of the current pool, inherited by the forked workers
+_worker_preprocessor = None
+
+
+def _init_preprocess_worker(preprocessor):
+    global _worker_preprocessor
+    _worker_preprocessor = preprocessor
+
+
+def _preprocess_chunk(texts):
+    return _worker_preprocessor.map(texts)
+
+
+def preprocess_batch(texts, preprocessor=None, workers=None, chunk_size=None, min_parallel=None, **flags):
+    """
+    Preprocess a list (or pandas Series) of texts, in order.
+    preprocessor is a compiled Preprocessor shared by all workers; without it one is
+    built from **flags (same flags as preprocess). Returns a list, or a Series with the
+    same index and name when a Series is given.
+    """
+    if preprocessor is None:
+        preprocessor = Preprocessor(**flags)
+    elif flags:
+        raise TypeError("Pass either a preprocessor or preprocess flags, not both")
+    workers = min(workers or PREPROCESS_WORKERS, os.cpu_count() or 1)
+    chunk_size = chunk_size or PREPROCESS_CHUNK_SIZE
+    min_parallel = PREPROCESS_PARALLEL_MIN if min_parallel is None else min_parallel
+
+    is_series = hasattr(texts, "index") and hasattr(texts, "tolist")
+    values = texts.tolist() if is_series else list(texts)
+
+    if workers <= 1 or len(values) < max(min_parallel, 2 * chunk_size):
+        results = preprocessor.map(values)
+    else:
+        chunks = [values[i:i + chunk_size] for i in range(0, len(values), chunk_size)]
+        # fork: workers get the already compiled preprocessor from the parent, nothing is re-built
+        ctx = multiprocessing.get_context("fork")
+        with ctx.Pool(min(workers, len(chunks)), initializer=_init_preprocess_worker, initargs=(preprocessor,)) as pool:
+            results = [text for chunk in pool.map(_preprocess_chunk, chunks) for text in chunk]
+
+    if is_series:
+        return type(texts)(results, index=texts.index, name=texts.name)
+    return results
@@ -1,106 +1,332 @@
+import os
 import pandas as pd
+from psycopg2.extras import execute_values
 from connect_to_database_func import connect_db
+from import_comments import backfill_content_hashes
 from datetime import timedelta
 import re
 
+# content_hash (import_comments.content_hash) is the stored hash of the normalized description + title.
+# Window 1: previous row of the same user (LAG) starts a new run when content_hash changes.
+# Window 2: inside a run, the recursive step walks the rows in order and keeps the last kept
+# comment as anchor; a row within 1 hour of the anchor is a duplicate of it, otherwise it
+# becomes the new anchor (same rule as the pandas loop in flag_repetitive_comments_pandas).
+# Each user's walk is seeded with their last kept comment in the hour before their first new
+# row, even when it is at or below the watermark, so a repeat of an already checked comment
+# still finds its anchor. Seeds are never updated.
+FLAG_REPETITIVE_SQL = r"""
+WITH RECURSIVE new_rows AS (
+    SELECT id, national_code_hash, created_at, content_hash
+    FROM dima_comments
+    WHERE id > %(watermark)s AND id <= %(scan_to)s
+      AND content_hash IS NOT NULL
+      AND (sentiment_result IS NULL OR sentiment_result = '')
+),
+first_new AS (
+    SELECT DISTINCT ON (national_code_hash) national_code_hash, created_at, id
+    FROM new_rows
+    ORDER BY national_code_hash, created_at, id
+),
+seeds AS (
+    SELECT seed.id, seed.national_code_hash, seed.created_at, seed.content_hash
+    FROM first_new f
+    CROSS JOIN LATERAL (
+        SELECT d.id, d.national_code_hash, d.created_at, d.content_hash
+        FROM dima_comments d
+        WHERE d.national_code_hash = f.national_code_hash
+          AND d.id <= %(watermark)s
+          AND d.content_hash IS NOT NULL
+          AND d.is_repetitive IS NOT TRUE
+          AND (d.created_at, d.id) < (f.created_at, f.id)
+          AND d.created_at >= f.created_at - INTERVAL '1 hour'
+        ORDER BY d.created_at DESC, d.id DESC
+        LIMIT 1
+    ) seed
+),
+scope AS (
+    SELECT * FROM new_rows
+    UNION ALL
+    SELECT * FROM seeds
+),
+runs AS (
+    SELECT id, national_code_hash, created_at,
+           SUM(run_start) OVER (PARTITION BY national_code_hash ORDER BY created_at, id) AS run_id
+    FROM (
+        SELECT s.*,
+               CASE WHEN LAG(content_hash) OVER w = content_hash
+                    THEN 0 ELSE 1 END AS run_start
+        FROM scope s
+        WINDOW w AS (PARTITION BY national_code_hash ORDER BY created_at, id)
+    ) starts
+),
+numbered AS (
+    SELECT id, national_code_hash, created_at, run_id,
+           ROW_NUMBER() OVER (PARTITION BY national_code_hash, run_id ORDER BY created_at, id) AS run_rn,
+           COUNT(*) OVER (PARTITION BY national_code_hash, run_id) AS run_size
+    FROM runs
+),
+chain AS (
+    SELECT national_code_hash, run_id, run_rn, id, id AS anchor_id, created_at AS anchor_time, FALSE AS is_duplicate
+    FROM numbered
+    WHERE run_rn = 1 AND run_size > 1
+    UNION ALL
+    SELECT n.national_code_hash, n.run_id, n.run_rn, n.id,
+           CASE WHEN n.created_at - c.anchor_time <= INTERVAL '1 hour' THEN c.anchor_id ELSE n.id END,
+           CASE WHEN n.created_at - c.anchor_time <= INTERVAL '1 hour' THEN c.anchor_time ELSE n.created_at END,
+           n.created_at - c.anchor_time <= INTERVAL '1 hour'
+    FROM chain c
+    JOIN numbered n
+      ON n.national_code_hash = c.national_code_hash AND n.run_id = c.run_id AND n.run_rn = c.run_rn + 1
+)
+UPDATE dima_comments AS d
+SET is_repetitive = TRUE, duplicate_of = c.anchor_id
+FROM chain c
+WHERE c.is_duplicate AND d.id = c.id AND c.id > %(watermark)s
+RETURNING d.id;
+"""
+
+# Ids are taken before commit, so a concurrent import can commit rows below MAX(id) after a
+# run. The watermark only advances to the end of the gap-free id range above it; rows past
+# a gap are examined again on the next run (flagging is idempotent). A gap is given up on
+# (rolled-back insert, deleted row) once the rows after it were imported
+# REPETITIVE_GAP_GRACE_MINUTES ago.
+REPETITIVE_GAP_GRACE_MINUTES = int(os.getenv("REPETITIVE_GAP_GRACE_MINUTES", "60"))
+
+NEXT_WATERMARK_SQL = """
+SELECT GREATEST(
+    %(watermark)s,
+    (SELECT MAX(id) FROM (
+        SELECT id, id - ROW_NUMBER() OVER (ORDER BY id) AS offset_from_watermark
+        FROM dima_comments
+        WHERE id > %(watermark)s AND id <= %(scan_to)s
+    ) ids WHERE offset_from_watermark = %(watermark)s),
+    (SELECT MAX(id) FROM dima_comments
+     WHERE id > %(watermark)s AND id <= %(scan_to)s
+       AND imported_at < NOW() - %(grace_minutes)s * INTERVAL '1 minute')
+);
+"""
+
+
+def ensure_repetitive_state(cur):
+    # watermark of the last dima_comments.id already checked, one row per detector
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS repetitive_detection_state (
+            name TEXT PRIMARY KEY,
+            last_id INTEGER NOT NULL,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        );
+        INSERT INTO repetitive_detection_state (name, last_id) VALUES ('exact', 0)
+        ON CONFLICT (name) DO NOTHING;
+    """)
+
+
 def flag_repetitive_comments():
     """
-    Flags repetitive comments within 1 hour per user,
-    using psycopg2 (with duplicate_of support and title matching).
+    Flags repetitive comments within 1 hour per user inside Postgres
+    (same content_hash, i.e. normalized description and title, within 1 hour of the
+    previous kept comment). insert_comments already flags repeats at import time; this
+    pass catches rows imported out of order. Only rows imported since the last run (id
+    above the watermark) are examined and only the rows found repetitive are updated.
+    The watermark stops before the first id gap (see NEXT_WATERMARK_SQL).
     """
     try:
-        # # Step 1️⃣: Reset repetitive flags in the database
-        # conn = connect_db()
-        # cur = conn.cursor()
-        # cur.execute("UPDATE dima_comments SET is_repetitive = FALSE, duplicate_of = NULL;")
-        # conn.commit()
-        # cur.close()
-        # conn.close()
-        # print("🔄 Reset all previous repetitive flags to FALSE and duplicate_of to NULL.")
-
-        # Step 2️⃣: Fetch required data (including title)
         conn = connect_db()
-        query = """
-            SELECT id, national_code_hash, title, description, created_at, sentiment_result
-            FROM dima_comments
-            WHERE description IS NOT NULL AND description != '' AND (sentiment_result IS NULL OR sentiment_result='') 
-            ORDER BY national_code_hash, created_at;
-        """
-        df = pd.read_sql(query, conn)
-        conn.close()
+        # Rows imported before content_hash existed get it once here
+        backfilled = backfill_content_hashes(conn)
+        if backfilled:
+            print(f"🔄 Computed content_hash for {backfilled} older comments.")
 
-        # Step 3️⃣: Filter out comments marked as 'no comments'
-        df = df[df["sentiment_result"] != "no comments"].copy()
-
-        # Step 4️⃣: Normalize text and timestamps
-        df["created_at"] = pd.to_datetime(df["created_at"], errors="coerce")
-        df["description_norm"] = (
-            df["description"]
-            .fillna("")
-            .apply(lambda x: re.sub(r"\s+", " ", x.strip()))
-        )
-        df["title_norm"] = (
-            df["title"]
-            .fillna("")
-            .apply(lambda x: re.sub(r"\s+", " ", x.strip()))
-        )
-
-        df.sort_values(["national_code_hash", "created_at"], inplace=True)
-        df["is_repetitive"] = False
-        df["duplicate_of"] = None
-
-        # Step 5️⃣: Detect duplicates per user (same text, same title, within 1 hour)
-        for user, group in df.groupby("national_code_hash", sort=False):
-            prev_desc = None
-            prev_title = None
-            prev_time = None
-            prev_id = None
-
-            for i in group.index:
-                desc = df.at[i, "description_norm"]
-                title = df.at[i, "title_norm"]
-                time = df.at[i, "created_at"]
-
-                if (
-                    prev_desc == desc
-                    and prev_title == title  # 🔹 ensure same title
-                    and pd.notnull(prev_time)
-                    and (time - prev_time).total_seconds() <= 3600  # 🔹 within 1 hour
-                ):
-                    df.at[i, "is_repetitive"] = True
-                    df.at[i, "duplicate_of"] = int(prev_id)
-                else:
-                    prev_desc = desc
-                    prev_title = title
-                    prev_time = time
-                    prev_id = df.at[i, "id"]
-
-        # Step 6️⃣: Write results back to DB (efficient and safe)
-        conn = connect_db()
-        conn.autocommit = True
         cur = conn.cursor()
+        ensure_repetitive_state(cur)
 
-        update_data = [
-            (
-                bool(row["is_repetitive"]),
-                int(row["duplicate_of"]) if pd.notna(row["duplicate_of"]) else None,
-                int(row["id"])
-            )
-            for _, row in df.iterrows()
-        ]
-
-        cur.executemany(
-            "UPDATE dima_comments SET is_repetitive = %s, duplicate_of = %s WHERE id = %s;",
-            update_data
-        )
+        # Lock the watermark so two runs never examine the same rows
+        cur.execute("SELECT last_id FROM repetitive_detection_state WHERE name = 'exact' FOR UPDATE;")
+        watermark = cur.fetchone()[0]
+        cur.execute("SELECT COALESCE(MAX(id), 0) FROM dima_comments;")
+        scan_to = cur.fetchone()[0]
+        if scan_to <= watermark:
+            conn.commit()
+            cur.close()
+            conn.close()
+            print("✅ Repetitive detection: no new comments since the last run.")
+            return 0
+
+        params = {"watermark": watermark, "scan_to": scan_to, "grace_minutes": REPETITIVE_GAP_GRACE_MINUTES}
+        cur.execute(FLAG_REPETITIVE_SQL, params)
+        repetitive_count = len(cur.fetchall())
 
+        # Rows imported before is_repetitive had a default still hold NULL; readers filter on FALSE
+        cur.execute("""
+            UPDATE dima_comments SET is_repetitive = FALSE
+            WHERE id > %s AND id <= %s AND is_repetitive IS NULL;
+        """, (watermark, scan_to))
+        cur.execute(NEXT_WATERMARK_SQL, params)
+        new_watermark = cur.fetchone()[0]
+        cur.execute("""
+            UPDATE repetitive_detection_state SET last_id = %s, updated_at = CURRENT_TIMESTAMP
+            WHERE name = 'exact';
+        """, (new_watermark,))
+        conn.commit()
         cur.close()
         conn.close()
 
-        repetitive_count = int(df["is_repetitive"].sum())
-        print(f"✅ Repetitive detection completed. Flagged {repetitive_count} new comments as repetitive.")
+        print(
+            f"✅ Repetitive detection completed for ids {watermark + 1}..{scan_to} (watermark now {new_watermark}). "
+            f"Flagged {repetitive_count} new comments as repetitive."
+        )
         return repetitive_count
 
     except Exception as e:
         print(f"❌ Error in flag_repetitive_comments: {e}")
         return 0
+
+
+def load_unscored_comments():
+    """Unscored, non-empty comments with normalized description/title, sorted by user and time."""
+    conn = connect_db()
+    query = """
+        SELECT id, national_code_hash, title, description, created_at, sentiment_result
+        FROM dima_comments
+        WHERE description IS NOT NULL AND description != '' AND (sentiment_result IS NULL OR sentiment_result='') 
+        ORDER BY national_code_hash, created_at;
+    """
+    df = pd.read_sql(query, conn)
+    conn.close()
+
+    # Filter out comments marked as 'no comments'
+    df = df[df["sentiment_result"] != "no comments"].copy()
+    return normalize_comments_frame(df)
+
+
+def normalize_comments_frame(df):
+    # Normalize text and timestamps
+    df["created_at"] = pd.to_datetime(df["created_at"], errors="coerce")
+    df["description_norm"] = (
+        df["description"]
+        .fillna("")
+        .apply(lambda x: re.sub(r"\s+", " ", x.strip()))
+    )
+    df["title_norm"] = (
+        df["title"]
+        .fillna("")
+        .apply(lambda x: re.sub(r"\s+", " ", x.strip()))
+    )
+    df.sort_values(["national_code_hash", "created_at"], inplace=True)
+    return df
+
+
+def mark_repetitive_loop(df):
+    """
+    Reference implementation: per-user loop over the sorted frame.
+    Sets is_repetitive / duplicate_of in place (same text, same title, within 1 hour
+    of the previous kept comment).
+    """
+    df["is_repetitive"] = False
+    df["duplicate_of"] = None
+
+    for user, group in df.groupby("national_code_hash", sort=False):
+        prev_desc = None
+        prev_title = None
+        prev_time = None
+        prev_id = None
+
+        for i in group.index:
+            desc = df.at[i, "description_norm"]
+            title = df.at[i, "title_norm"]
+            time = df.at[i, "created_at"]
+
+            if (
+                prev_desc == desc
+                and prev_title == title  # 🔹 ensure same title
+                and pd.notnull(prev_time)
+                and (time - prev_time).total_seconds() <= 3600  # 🔹 within 1 hour
+            ):
+                df.at[i, "is_repetitive"] = True
+                df.at[i, "duplicate_of"] = int(prev_id)
+            else:
+                prev_desc = desc
+                prev_title = title
+                prev_time = time
+                prev_id = df.at[i, "id"]
+    return df
+
+
+def mark_repetitive_vectorized(df):
+    """
+    Same result as mark_repetitive_loop without a Python loop over rows.
+    shift() on (user, description, title) splits the sorted frame into runs of identical
+    comments. Inside a run every row within 1 hour of the segment's first row repeats it;
+    the first later row starts a new segment. Segments are split again until no row is
+    later than 1 hour, so there is one iteration per anchor reset, not per row.
+    """
+    user = df["national_code_hash"]
+    time = df["created_at"]
+    # A missing timestamp never repeats and is never repeated (as in the loop)
+    anchor = (
+        (user != user.shift())
+        | (df["description_norm"] != df["description_norm"].shift())
+        | (df["title_norm"] != df["title_norm"].shift())
+        | time.isna()
+        | time.shift().isna()
+    )
+
+    while True:
+        segment = anchor.cumsum()
+        anchor_time = time.where(anchor).groupby(segment).transform("first")
+        late = (time - anchor_time) > pd.Timedelta(hours=1)
+        # times are sorted inside a segment, so late rows are a suffix; its first row is the new anchor
+        new_anchor = late & ~(late.shift(fill_value=False) & (segment == segment.shift()))
+        if not new_anchor.any():
+            break
+        anchor = anchor | new_anchor
+
+    anchor_id = df["id"].where(anchor).groupby(anchor.cumsum()).transform("first")
+    df["is_repetitive"] = ~anchor
+    # object column of int / None, like the loop
+    df["duplicate_of"] = pd.Series(
+        [int(anchor_value) if repetitive else None for anchor_value, repetitive in zip(anchor_id, df["is_repetitive"])],
+        index=df.index,
+        dtype=object
+    )
+    return df
+
+
+def write_repetitive_flags(df):
+    """Write only the flagged rows, through one UPDATE ... FROM a temp table."""
+    flagged = df[df["is_repetitive"]]
+    rows = [(int(comment_id), int(duplicate_of)) for comment_id, duplicate_of in zip(flagged["id"], flagged["duplicate_of"])]
+    if not rows:
+        return 0
+
+    conn = connect_db()
+    cur = conn.cursor()
+    cur.execute("CREATE TEMP TABLE repetitive_flags (id INTEGER PRIMARY KEY, duplicate_of INTEGER) ON COMMIT DROP;")
+    execute_values(cur, "INSERT INTO repetitive_flags (id, duplicate_of) VALUES %s;", rows, page_size=5000)
+    cur.execute("""
+        UPDATE dima_comments AS d
+        SET is_repetitive = TRUE, duplicate_of = f.duplicate_of
+        FROM repetitive_flags f
+        WHERE d.id = f.id;
+    """)
+    conn.commit()
+    cur.close()
+    conn.close()
+    return len(rows)
+
+
+def flag_repetitive_comments_pandas():
+    """
+    Flags repetitive comments within 1 hour per user,
+    using psycopg2 (with duplicate_of support and title matching).
+    In-memory version of flag_repetitive_comments, kept for one-off backfills.
+    Only flagged rows are written; reset the flags first to re-check rows flagged before.
+    """
+    try:
+        df = mark_repetitive_vectorized(load_unscored_comments())
+        repetitive_count = write_repetitive_flags(df)
+        print(f"✅ Repetitive detection completed. Flagged {repetitive_count} new comments as repetitive.")
+        return repetitive_count
+
+    except Exception as e:
+        print(f"❌ Error in flag_repetitive_comments_pandas: {e}")
+        return 0
@@ -0,0 +1,63 @@
+import logging
+
+from cafe_bazar_app.batch_scheduler import cap_text, plan_batches, run_in_token_batches
+
+
+class FakeTokenizer:
+    """One token per whitespace-separated word."""
+
+    def __call__(self, texts, add_special_tokens=True, **kwargs):
+        if isinstance(texts, str):
+            return {"input_ids": texts.split()}
+        return {"input_ids": [text.split() for text in texts]}
+
+    def decode(self, ids, skip_special_tokens=True):
+        return " ".join(ids)
+
+
+def test_plan_batches_sorts_by_length_and_respects_budget():
+    lengths = [10, 1, 7, 3, 3, 12, 2, 8]
+    batches = plan_batches(lengths, token_budget=20, max_batch_size=3)
+
+    order = [i for batch in batches for i in batch]
+    assert sorted(order) == list(range(len(lengths)))
+    assert [lengths[i] for i in order] == sorted(lengths)
+    for batch in batches:
+        assert len(batch) <= 3
+        assert len(batch) * max(lengths[i] for i in batch) <= 20
+
+
+def test_plan_batches_gives_an_oversized_item_its_own_batch():
+    assert plan_batches([50, 1, 1], token_budget=10) == [[1, 2], [0]]
+    assert plan_batches([], token_budget=10) == []
+
+
+def test_cap_text_keeps_whole_sentences():
+    tokenizer = FakeTokenizer()
+    text = "one two three. four five! six seven eight nine"
+    assert cap_text(tokenizer, text, max_tokens=5) == "one two three. four five!"
+    assert cap_text(tokenizer, text, max_tokens=4) == "one two three."
+    # a first sentence longer than the limit is cut at the token limit
+    assert cap_text(tokenizer, text, max_tokens=2) == "one two"
+
+
+def test_run_in_token_batches_returns_input_order():
+    tokenizer = FakeTokenizer()
+    texts = ["a b c d e f", "a", "a b c", "a b", "a b c d e f g h i j. k l"]
+    calls = []
+
+    def run_batch(batch):
+        calls.append(batch)
+        return [text.upper() for text in batch]
+
+    results = run_in_token_batches(
+        logging.getLogger("test"), tokenizer, texts, run_batch,
+        token_budget=12, max_batch_size=2, max_tokens=10
+    )
+
+    capped = "a b c d e f g h i j."
+    assert results == [text.upper() for text in texts[:4]] + [capped.upper()]
+    assert sorted(text for batch in calls for text in batch) == sorted(texts[:4] + [capped])
+    for batch in calls:
+        assert len(batch) <= 2
+        assert len(batch) * max(len(text.split()) for text in batch) <= 12
@@ -0,0 +1,47 @@
+import pytest
+
+# near_duplicate_detection imports the DB helpers (psycopg2, dotenv) and repetitive_detection (pandas)
+pytest.importorskip("psycopg2")
+pytest.importorskip("dotenv")
+pytest.importorskip("pandas")
+pytest.importorskip("numpy")
+
+from near_duplicate_detection import sign_comments, cluster_page, minhash_signature, minhash_signatures
+from near_duplicate_detection import shingle_hashes, NEAR_DUP_MIN_SHINGLES, _PERMUTATIONS, _MERSENNE_PRIME, _MAX_HASH
+
+CAMPAIGN = "برنامه خیلی کند است و پرداخت قبض انجام نمیشود لطفا درست کنید"
+
+
+def test_short_common_comments_do_not_cluster():
+    # 300 users posting "عالی" and 200 posting "خوبه" are not a campaign
+    rows = [(comment_id, "عالی") for comment_id in range(1, 301)]
+    rows += [(comment_id, "خوبه") for comment_id in range(301, 501)]
+    comments = sign_comments(rows)
+    assert comments == []
+    clusters, merged, indexed = cluster_page(comments, {}, {})
+    assert clusters == {}
+
+
+def test_copied_comments_cluster_and_copies_are_not_reindexed():
+    rows = [(1, CAMPAIGN), (2, CAMPAIGN), (3, CAMPAIGN + "!!"), (4, "پشتیبانی خیلی خوب جواب داد ممنون از همه")]
+    clusters, merged, indexed = cluster_page(sign_comments(rows), {}, {})
+    assert clusters == {1: 1, 2: 1, 3: 1}
+    # comment 2 is an exact copy of 1: it joins the cluster without adding bucket rows
+    assert 2 not in indexed
+    assert 4 in indexed
+
+
+def test_lightly_edited_comment_is_signed():
+    assert minhash_signature(CAMPAIGN.replace("نمیشود", "نمیشه")) is not None
+
+
+def test_batched_signatures_match_the_scalar_definition():
+    texts = [CAMPAIGN, CAMPAIGN + "!!", "عالی", "", "پشتیبانی خیلی خوب جواب داد ممنون از همه ۱۲۳"]
+    expected = []
+    for text in texts:
+        hashes = shingle_hashes(text)
+        if len(hashes) < NEAR_DUP_MIN_SHINGLES:
+            expected.append(None)
+        else:
+            expected.append([min(((a * h + b) % _MERSENNE_PRIME) & _MAX_HASH for h in hashes) for a, b in _PERMUTATIONS])
+    assert minhash_signatures(texts) == expected
@@ -0,0 +1,44 @@
+import pytest
+
+from cafe_bazar_app.phrase_rules import PhraseRuleEngine
+
+RULES = {
+    "no sentiment expressed": ["بد نیست", "معمولی"],
+    "very positive": ["عالیه", "خیلی خوبه", "معمولی"],
+    "very negative": ["خیلی بد"],
+}
+
+
+def test_exact_mode_matches_the_whole_normalized_comment():
+    engine = PhraseRuleEngine(RULES, mode="exact")
+    assert engine.match("عالیه") == "very positive"
+    assert engine.match("  خیلی   خوبه ") == "very positive"
+    assert engine.match("برنامه عالیه") is None
+    assert engine.match(None) is None
+
+
+def test_substring_mode_finds_phrases_inside_the_comment():
+    engine = PhraseRuleEngine(RULES, mode="substring")
+    assert engine.match("برنامه عالیه") == "very positive"
+    assert engine.match("واقعا خیلی بد بود") == "very negative"
+    assert engine.match("هیچی") is None
+
+
+def test_earlier_label_wins():
+    # "معمولی" is listed under two labels
+    assert PhraseRuleEngine(RULES, mode="exact").match("معمولی") == "no sentiment expressed"
+    # two different phrases in one comment: the label listed first wins
+    engine = PhraseRuleEngine(RULES, mode="substring")
+    assert engine.match("عالیه ولی بد نیست") == "no sentiment expressed"
+
+
+def test_version_follows_rules_and_mode():
+    version = PhraseRuleEngine(RULES).version
+    assert PhraseRuleEngine(dict(RULES)).version == version
+    assert PhraseRuleEngine(RULES, mode="substring").version != version
+    assert PhraseRuleEngine({**RULES, "very negative": ["افتضاح"]}).version != version
+
+
+def test_unknown_mode_is_rejected():
+    with pytest.raises(ValueError):
+        PhraseRuleEngine(RULES, mode="regex")
@@ -0,0 +1,76 @@
+import itertools
+import pickle
+import pytest
+
+from preprocessing_func import (
+    character_table, normalize_characters,
+    convert_fa_numbers, convert_ar_characters, remove_diacritics, remove_half_space,
+)
+from preprocessing_main import preprocess, Preprocessor, preprocess_batch
+
+
+TEXTS = [
+    "  برنامه‌ی خوبیه ۱۲۳ تا ستاره میدم  ",
+    "كيفيت عالي بود، ممنونم!!! ٤٥٦",
+    "می خواهم   اپلیکیشن‌ها رو ببینم\nخیلیییی خوب",
+    "سَلام دوستان؛ نظرتون چیه؟ 5",
+    "3",
+    "",
+]
+
+PROFILES = [
+    {},
+    # Ngram.NGRAM_PREPROCESSOR
+    dict(convert_farsi_numbers=True, convert_arabic_characters=True, remove_diacritic=True,
+         remove_numbers=True, remove_punctuations=True, replace_multiple_spaces=True, remove_ha_suffix=True),
+    # LLM_function_analysis / LLM_summarize matching
+    dict(remove_halfspace=True, replace_multiple_spaces=True, replace_enter_with_space=True),
+    dict(convert_english_numbers=True, remove_extra_characters=True, handle_prefix=True,
+         map_number_to_text=True, add_spaces_punc=True, remove_ha_suffix=False),
+    dict(drop_short_phrases=2, remove_punctuation_exception_keep=["!", "؟"],
+         remove_specific_phrases=["ممنونم"], remove_space_after_word=["می"],
+         replace_before_space_with_half_space=["ها"]),
+]
+
+
+@pytest.mark.parametrize("flags", list(itertools.product([False, True], repeat=4)))
+def test_character_table_matches_the_separate_conversions(flags):
+    farsi_numbers, arabic_characters, diacritic, halfspace = flags
+    table = character_table(farsi_numbers, arabic_characters, diacritic, halfspace)
+
+    for text in TEXTS:
+        expected = text
+        if farsi_numbers:
+            expected = convert_fa_numbers(expected)
+        if arabic_characters:
+            expected = convert_ar_characters(expected)
+        if diacritic:
+            expected = remove_diacritics(expected)
+        if halfspace:
+            expected = remove_half_space(expected)
+        assert normalize_characters(text, table) == expected
+
+
+@pytest.mark.parametrize("flags", PROFILES)
+def test_preprocessor_matches_preprocess(flags):
+    preprocessor = Preprocessor(**flags)
+    for text in TEXTS:
+        assert preprocessor(text) == preprocess(text, **flags)
+    assert preprocessor.map(TEXTS) == [preprocess(text, **flags) for text in TEXTS]
+
+
+def test_preprocessor_survives_pickling():
+    # worker processes receive the compiled preprocessor by pickling
+    preprocessor = Preprocessor(**PROFILES[1])
+    assert pickle.loads(pickle.dumps(preprocessor)).map(TEXTS) == preprocessor.map(TEXTS)
+
+
+def test_preprocessor_rejects_unknown_flags():
+    with pytest.raises(TypeError):
+        Preprocessor(remove_halfspaces=True)
+
+
+def test_preprocess_batch_keeps_order():
+    flags = PROFILES[2]
+    texts = TEXTS * 3
+    assert preprocess_batch(texts, workers=1, **flags) == [preprocess(text, **flags) for text in texts]
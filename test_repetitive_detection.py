@@ -0,0 +1,59 @@
+import pytest
+
+# repetitive_detection / import_comments import pandas and the database helpers
+pd = pytest.importorskip("pandas")
+pytest.importorskip("psycopg2")
+pytest.importorskip("dotenv")
+
+from benchmark_repetitive import synthetic_comments
+from import_comments import content_hash
+from repetitive_detection import normalize_comments_frame, mark_repetitive_loop, mark_repetitive_vectorized
+
+
+def assert_same_flags(df):
+    looped = mark_repetitive_loop(df.copy())
+    vectorized = mark_repetitive_vectorized(df.copy())
+    assert looped["is_repetitive"].tolist() == vectorized["is_repetitive"].tolist()
+    assert looped["duplicate_of"].tolist() == vectorized["duplicate_of"].tolist()
+    return vectorized
+
+
+@pytest.mark.parametrize("seed", [1, 7, 42])
+def test_vectorized_matches_loop(seed):
+    df = normalize_comments_frame(synthetic_comments(3000, users=40, seed=seed))
+    assert assert_same_flags(df)["is_repetitive"].any()
+
+
+def test_vectorized_matches_loop_with_missing_times_and_spacing():
+    rows = [
+        (1, "u1", "ورود", "خوب است", "2025-01-01 10:00"),
+        (2, "u1", "ورود", "خوب   است ", "2025-01-01 10:30"),
+        (3, "u1", "ورود", "خوب است", "2025-01-01 11:10"),
+        (4, "u1", "ورود", "خوب است", "2025-01-01 11:20"),
+        (5, "u1", None, "خوب است", "2025-01-01 11:25"),
+        (6, "u2", "ورود", "خوب است", None),
+        (7, "u2", "ورود", "خوب است", "2025-01-01 10:00"),
+        (8, "u2", "ورود", "خوب است", "2025-01-01 10:00"),
+    ]
+    df = pd.DataFrame(rows, columns=["id", "national_code_hash", "title", "description", "created_at"])
+    flagged = assert_same_flags(normalize_comments_frame(df)).set_index("id")
+    # 2 repeats 1; 3 is over an hour after 1 and becomes the new anchor for 4
+    assert flagged["is_repetitive"].to_dict() == {1: False, 2: True, 3: False, 4: True, 5: False, 6: False, 7: False, 8: True}
+    assert flagged.at[4, "duplicate_of"] == 3
+
+
+def test_content_hash_normalizes_whitespace():
+    assert content_hash("ورود", "خوب   است") == content_hash(" ورود ", "\nخوب است\t")
+    assert content_hash(None, "خوب است") == content_hash("", "خوب است")
+
+
+def test_content_hash_depends_on_title_and_description():
+    assert content_hash("ورود", "خوب است") != content_hash("پرداخت", "خوب است")
+    assert content_hash("ورود", "خوب است") != content_hash("ورود", "خوب نیست")
+    # the separator keeps title and description apart
+    assert content_hash("b", "a") != content_hash("", "a b")
+
+
+def test_content_hash_skips_empty_descriptions():
+    assert content_hash("ورود", None) is None
+    assert content_hash("ورود", "   ") is None
@@ -0,0 +1,42 @@
+import logging
+import pytest
+
+# sentiment_model_func loads the transformers / torch / sklearn stack at import
+pytest.importorskip("torch")
+pytest.importorskip("transformers")
+pytest.importorskip("sklearn")
+
+from cafe_bazar_app import sentiment_model_func
+
+
+class FakeTokenizer:
+    def __call__(self, texts, add_special_tokens=True, **kwargs):
+        return {"input_ids": [text.split() for text in texts]}
+
+
+class FakeClassifier:
+    """Records every pipeline call instead of running DistilBERT."""
+
+    def __init__(self):
+        self.tokenizer = FakeTokenizer()
+        self.calls = []
+
+    def __call__(self, texts, **kwargs):
+        self.calls.append((list(texts), kwargs))
+        return [{"label": "POSITIVE", "score": 0.9} for _ in texts]
+
+
+def test_classifier_receives_batch_size(monkeypatch):
+    classifier = FakeClassifier()
+    monkeypatch.setattr(sentiment_model_func, "get_models", lambda: (None, None, classifier, None))
+    monkeypatch.setattr(sentiment_model_func, "translate_texts", lambda logger, texts: list(texts))
+
+    texts = ["good app", "very good app", "fast", "works well now"]
+    labels = sentiment_model_func.run_second_model_batch(logging.getLogger("test"), texts)
+
+    assert labels == ["POSITIVE"] * len(texts)
+    assert sum(len(batch) for batch, _ in classifier.calls) == len(texts)
+    for batch, kwargs in classifier.calls:
+        # one forward pass per token-budget batch, not one per text
+        assert kwargs["batch_size"] == len(batch)
+        assert kwargs["truncation"] is True
@@ -0,0 +1,33 @@
+import logging
+import pytest
+
+# sentiment_model_func loads the transformers / torch / sklearn stack at import
+pytest.importorskip("torch")
+pytest.importorskip("transformers")
+pytest.importorskip("sklearn")
+
+from cafe_bazar_app import sentiment_model_func
+from cafe_bazar_app.sentiment_cache import SentimentCache, make_cache_key
+
+
+def test_cache_key_ignores_spacing():
+    assert make_cache_key("v1", "  برنامه   خوب ") == make_cache_key("v1", "برنامه خوب")
+    assert make_cache_key("v1", "برنامه خوب") != make_cache_key("v2", "برنامه خوب")
+
+
+def test_failed_first_model_labels_are_not_cached(monkeypatch):
+    cache = SentimentCache(path=None)
+    monkeypatch.setattr(sentiment_model_func, "get_sentiment_cache", lambda: cache)
+
+    def fake_batch(logger, contexts, batch_size=None, fallback="no sentiment expressed"):
+        # the second comment fails (e.g. an OOM in its retry)
+        return ["positive", fallback]
+
+    monkeypatch.setattr(sentiment_model_func, "run_first_model_batch", fake_batch)
+    version = sentiment_model_func.first_model_version()
+
+    labels = sentiment_model_func.run_first_model_cached(logging.getLogger("test"), ["خوب", "کند"])
+
+    assert labels == ["positive", "no sentiment expressed"]
+    assert cache.get(version, "خوب") == "positive"
+    assert cache.get(version, "کند") is None
@@ -0,0 +1,83 @@
+import logging
+import pytest
+
+# sentiment_engine loads the transformers / torch / sklearn stack at import
+pytest.importorskip("torch")
+pytest.importorskip("transformers")
+pytest.importorskip("sklearn")
+
+from cafe_bazar_app import sentiment_engine
+from cafe_bazar_app.sentiment_engine import SentimentSource, DIMA_SENTIMENT_SCORES, score_comments
+from cafe_bazar_app.sentiment_model_func import (
+    FIRST_MODEL_STAGE, SECOND_MODEL_STAGE, plan_sentiment_stages, apply_second_model,
+    EMPTY_SOURCE, PHRASE_RULE_SOURCE, DISTILLED_SOURCE, FIRST_MODEL_SOURCE, SECOND_MODEL_SOURCE, FAILED_SOURCE,
+)
+
+
+def test_plan_sentiment_stages():
+    # phrase rule: no model at all
+    assert plan_sentiment_stages("عالیه", 3) == []
+    # the fallback can only change ratings 1 and 5
+    assert plan_sentiment_stages("برنامه کند است", 3) == [FIRST_MODEL_STAGE]
+    assert plan_sentiment_stages("برنامه کند است", 1) == [FIRST_MODEL_STAGE, SECOND_MODEL_STAGE]
+    assert plan_sentiment_stages("برنامه کند است", 5) == [FIRST_MODEL_STAGE, SECOND_MODEL_STAGE]
+
+
+def test_apply_second_model():
+    assert apply_second_model("neutral", "NEGATIVE", 1) == ("negative", True)
+    assert apply_second_model("neutral", "POSITIVE", 5) == ("positive", True)
+    # label disagrees with the rating: MT5 label is kept
+    assert apply_second_model("neutral", "POSITIVE", 1) == ("neutral", False)
+    assert apply_second_model("mixed", "NEGATIVE", 3) == ("mixed", False)
+
+
+def test_score_comments_labels_and_sources(monkeypatch):
+    first_tier = {
+        "خوب کار می‌کند": ("very positive", DISTILLED_SOURCE),
+        "نمی‌دانم": ("neutral", FIRST_MODEL_SOURCE),
+        "کند است ولی کار می‌کند": ("mixed", FIRST_MODEL_SOURCE),
+        "راضی نیستم": ("no sentiment expressed", FAILED_SOURCE),
+        "هیچ نظری": ("neutral", FIRST_MODEL_SOURCE),
+    }
+    second_model_calls = []
+
+    def fake_first_tier(logger, contexts, batch_size=None):
+        return [first_tier[text][0] for text in contexts], [first_tier[text][1] for text in contexts]
+
+    def fake_second_model(logger, texts):
+        second_model_calls.append(list(texts))
+        return ["NEGATIVE" if text == "راضی نیستم" else "POSITIVE" for text in texts]
+
+    monkeypatch.setattr(sentiment_engine, "run_first_tier", fake_first_tier)
+    monkeypatch.setattr(sentiment_engine, "run_second_model_batch_cached", fake_second_model)
+
+    source = SentimentSource("test", "comments", "id", "description", "rating", DIMA_SENTIMENT_SCORES,
+                             "TRUE", empty_result=("no sentiment expressed", 3))
+    items = [
+        (source, 1, "  ", 3),
+        (source, 2, "عالیه", 1),
+        (source, 3, "خوب کار می‌کند", 5),
+        (source, 4, "نمی‌دانم", 3),
+        (source, 5, "کند است ولی کار می‌کند", 5),
+        (source, 6, "راضی نیستم", 5),
+        (source, 7, "هیچ نظری", 1),
+    ]
+    results, stats = score_comments(logging.getLogger("test"), items)
+
+    assert [row[1:] for row in results] == [
+        (1, "no sentiment expressed", 3, False, EMPTY_SOURCE),
+        (2, "very positive", 5, False, PHRASE_RULE_SOURCE),
+        (3, "very positive", 5, False, DISTILLED_SOURCE),
+        (4, "neutral", 3, False, FIRST_MODEL_SOURCE),
+        (5, "positive", 4, True, SECOND_MODEL_SOURCE),
+        (6, "no sentiment expressed", 3, False, FAILED_SOURCE),
+        (7, "neutral", 3, False, FIRST_MODEL_SOURCE),
+    ]
+    # one batched fallback call, only for unclear labels on ratings 1 / 5
+    assert second_model_calls == [["کند است ولی کار می‌کند", "راضی نیستم", "هیچ نظری"]]
+    assert stats["phrase_rule_matched"] == 1
+    assert stats["distilled_model_used"] == 1
+    assert stats["first_model_run"] == 4
+    assert stats["second_model_run"] == 3
+    assert stats["second_model_skipped_by_plan"] == 1
+    assert stats["second_model_not_triggered"] == 1